@@ -3,4 +3,6 @@ from app import create_app
 app = create_app()
 
 if __name__ == "__main__":
+    from app.purge import purge_sweeper
+    purge_sweeper.ensure_started()
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
@@ -12,8 +12,12 @@ def create_app():
     # Register routes (we'll define them in a moment)
     from .routes.log_routes import log_bp
     from .routes.settings_routes import settings_bp
+    from .routes.admin_routes import admin_bp
+    from .routes.alert_routes import alert_bp
     
     app.register_blueprint(log_bp, url_prefix="/logs")
     app.register_blueprint(settings_bp, url_prefix="/settings")
+    app.register_blueprint(admin_bp, url_prefix="/admin")
+    app.register_blueprint(alert_bp, url_prefix="/alerts")
 
     return app
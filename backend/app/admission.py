@@ -0,0 +1,125 @@
+import math
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ingest_rate_per_source = float(os.getenv("INGEST_RATE_PER_SOURCE", "100"))
+ingest_burst_per_source = float(os.getenv("INGEST_BURST_PER_SOURCE", "200"))
+ingest_max_in_flight = int(os.getenv("INGEST_MAX_IN_FLIGHT", "32"))
+ingest_max_sources = int(os.getenv("INGEST_MAX_SOURCES", "10000"))
+
+
+class IngestAdmission:
+    """
+    Admission control for log ingest.
+
+    Each source (API key or userId) gets a token bucket refilled at `rate` tokens
+    per second up to `burst`; a request spends one token. On top of that at most
+    `max_in_flight` writes run at once in this process. A rejected request gets
+    the number of seconds after which a retry can succeed.
+    """
+
+    def __init__(self, rate=100.0, burst=200.0, max_in_flight=32, max_sources=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.max_sources = max_sources
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.admitted = 0
+        self.rejected_rate = 0
+        self.rejected_in_flight = 0
+        self._rejected_by_source = Counter()
+
+    def try_admit(self, source, label=None, cost=1):
+        """
+        Admit one write of `cost` logs from source. Returns None when admitted (the
+        caller must call release() afterwards), otherwise a Retry-After value in
+        seconds. label is what the stats report for the source, e.g. a masked API key.
+        """
+        return self.try_admit_sources({source: cost}, labels={source: label} if label else None)
+
+    def try_admit_sources(self, costs, labels=None):
+        """
+        Admit one write that charges several sources, e.g. a bulk request with
+        records from many users; costs maps each source to its number of logs.
+        Either every source is charged or none is. Returns like try_admit
+        """
+        costs = {str(source) if source is not None else "anonymous": cost for source, cost in costs.items()}
+        labels = {str(source) if source is not None else "anonymous": label for source, label in (labels or {}).items()}
+        now = time.monotonic()
+        with self._lock:
+            if self.max_in_flight > 0 and self._in_flight >= self.max_in_flight:
+                self.rejected_in_flight += 1
+                for source in costs:
+                    self._count_rejection(labels.get(source) or source)
+                return 1
+
+            if self.rate > 0:
+                refilled = {}
+                retry_after = None
+                for source, cost in costs.items():
+                    tokens, updated = self._buckets.pop(source, (self.burst, now))
+                    tokens = min(self.burst, tokens + (now - updated) * self.rate)
+                    # A batch larger than the burst could never be admitted, so cap its cost
+                    cost = min(cost, self.burst)
+                    refilled[source] = (tokens, cost)
+                    if tokens < cost:
+                        self._count_rejection(labels.get(source) or source)
+                        retry_after = max(retry_after or 1, math.ceil((cost - tokens) / self.rate))
+                if retry_after is not None:
+                    for source, (tokens, _) in refilled.items():
+                        self._buckets[source] = (tokens, now)
+                    self.rejected_rate += 1
+                    return retry_after
+                for source, (tokens, cost) in refilled.items():
+                    self._buckets[source] = (tokens - cost, now)
+                # Forget the least recently active sources; they come back with a full bucket
+                while len(self._buckets) > self.max_sources:
+                    self._buckets.popitem(last=False)
+
+            self._in_flight += 1
+            self.admitted += 1
+            return None
+
+    def release(self):
+        """Mark an admitted write as finished"""
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+    def _count_rejection(self, label):
+        self._rejected_by_source[label] += 1
+        if len(self._rejected_by_source) > self.max_sources:
+            self._rejected_by_source = Counter(dict(self._rejected_by_source.most_common(self.max_sources // 2)))
+
+    def stats(self):
+        """Return admission counters for this process"""
+        with self._lock:
+            return {
+                "admitted": self.admitted,
+                "rejectedRateLimited": self.rejected_rate,
+                "rejectedInFlight": self.rejected_in_flight,
+                "inFlight": self._in_flight,
+                "maxInFlight": self.max_in_flight,
+                "ratePerSource": self.rate,
+                "burstPerSource": self.burst,
+                "trackedSources": len(self._buckets),
+                "topRejectedSources": [
+                    {"source": source, "rejected": count}
+                    for source, count in self._rejected_by_source.most_common(10)
+                ]
+            }
+
+
+ingest_admission = IngestAdmission(
+    rate=ingest_rate_per_source,
+    burst=ingest_burst_per_source,
+    max_in_flight=ingest_max_in_flight,
+    max_sources=ingest_max_sources
+)
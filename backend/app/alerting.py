@@ -0,0 +1,255 @@
+import calendar
+import datetime
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.archive import matches_query
+from app.periodic import PeriodicTask
+from app.repositories.alert_repository import (
+    get_alert_rules, add_window_counts, seed_window_counts, get_window_counts, set_alert_state
+)
+from app.repositories.log_repository import build_logs_filter, get_log_bucket_counts
+
+alerts_enabled = os.getenv("ALERTS_ENABLED", "true").lower() == "true"
+alert_flush_seconds = float(os.getenv("ALERT_FLUSH_SECONDS", "1"))
+alert_rules_refresh_seconds = float(os.getenv("ALERT_RULES_REFRESH_SECONDS", "30"))
+# Each rule's window is tracked as this many buckets
+ALERT_WINDOW_BUCKETS = 30
+
+
+def _epoch_seconds(timestamp):
+    if timestamp.tzinfo is not None:
+        return timestamp.timestamp()
+    return calendar.timegm(timestamp.timetuple()) + timestamp.microsecond / 1e6
+
+
+class _RuleWindow:
+    def __init__(self, rule):
+        self.rule = rule
+        self.id = rule["id"]
+        self.threshold = rule["threshold"]
+        self.window_seconds = rule["windowSeconds"]
+        self.bucket_seconds = max(1, self.window_seconds // ALERT_WINDOW_BUCKETS)
+        # Matched against records as validated, before the message is compacted
+        self.query = build_logs_filter(
+            level=rule.get("level"), user_id=rule.get("userId"), tag=rule.get("tag"),
+            search=rule.get("search"), stored=False
+        )
+        self.shared = {}
+        self.pending = {}
+        self.firing = rule.get("state") == "firing"
+        self.firing_since = rule.get("firingSince")
+        self.seeded = False
+        # Set when the rule's filter can't be evaluated; the rule is skipped from then on
+        self.broken = False
+
+    def bucket(self, epoch):
+        return int(epoch // self.bucket_seconds * self.bucket_seconds)
+
+    def count(self, now):
+        start = self.bucket(now - self.window_seconds + self.bucket_seconds)
+        shared = sum(count for bucket, count in self.shared.items() if bucket >= start)
+        return shared + sum(count for bucket, count in self.pending.items() if bucket >= start)
+
+
+class AlertEngine:
+    """
+    Evaluates stored alert rules against the ingest stream without querying logs.
+
+    Every accepted record is matched in memory against each rule's filter and
+    counted into the rule's time buckets. A background flush adds each process's
+    counts to shared bucket documents and reads back the totals of all processes,
+    so a rule fires on the deployment-wide count. A rule seen for the first time
+    (new rule or restarted process) rebuilds its window from the stored logs.
+    """
+
+    def __init__(self, flush_seconds=1, rules_refresh_seconds=30):
+        self.flush_seconds = flush_seconds
+        self.rules_refresh_seconds = rules_refresh_seconds
+        self._rules = {}
+        self._rules_loaded_at = None
+        self._lock = threading.Lock()
+        self._flusher = PeriodicTask("alert-flush", flush_seconds, self._refresh_and_flush)
+        self._transitions = []
+
+    def observe(self, log_entry):
+        """Count a validated log record towards every rule it matches"""
+        self._ensure_rules()
+        if not self._rules:
+            return
+        timestamp = log_entry.get("timestamp")
+        if not isinstance(timestamp, datetime.datetime):
+            return
+        epoch = _epoch_seconds(timestamp)
+        now = time.time()
+        with self._lock:
+            for window in self._rules.values():
+                if window.broken or epoch < now - window.window_seconds:
+                    continue
+                try:
+                    matched = matches_query(log_entry, window.query)
+                except Exception as e:
+                    # A bad rule must never fail ingestion
+                    window.broken = True
+                    print(f"Skipping alert rule {window.id}: {e}")
+                    continue
+                if not matched:
+                    continue
+                bucket = window.bucket(epoch)
+                window.pending[bucket] = window.pending.get(bucket, 0) + 1
+                if not window.firing:
+                    self._evaluate(window, now)
+        self._flusher.ensure_started()
+
+    def alerts(self):
+        """Return every rule with its current count and firing state"""
+        self._ensure_rules()
+        self._flusher.ensure_started()
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    **window.rule,
+                    "count": window.count(now),
+                    "state": "firing" if window.firing else "ok",
+                    "firingSince": window.firing_since
+                }
+                for window in self._rules.values()
+            ]
+
+    def reload_rules(self):
+        """Drop the cached rules so the next call reads them from MongoDB"""
+        with self._lock:
+            self._rules_loaded_at = None
+
+    def flush(self):
+        """Publish pending counts, read back the shared windows and record state changes"""
+        with self._lock:
+            windows = list(self._rules.values())
+            increments = {}
+            expire_at = {}
+            for window in windows:
+                if not window.pending:
+                    continue
+                expire_at[window.id] = self._expire_at(window, max(window.pending))
+                for bucket, count in window.pending.items():
+                    increments[(window.id, bucket)] = count
+                    # Counted in shared until the totals are read back below
+                    window.shared[bucket] = window.shared.get(bucket, 0) + count
+                window.pending = {}
+        if not windows:
+            return
+
+        try:
+            add_window_counts(increments, expire_at)
+        except Exception as e:
+            print(f"Error publishing alert counts: {e}")
+            # Keep the counts for the next flush
+            with self._lock:
+                for window in windows:
+                    for (rule_id, bucket), count in increments.items():
+                        if rule_id == window.id:
+                            window.pending[bucket] = window.pending.get(bucket, 0) + count
+                            window.shared[bucket] -= count
+            return
+
+        for window in windows:
+            if window.seeded or window.broken:
+                continue
+            try:
+                self._seed(window)
+            except Exception as e:
+                print(f"Error seeding alert rule {window.id}: {e}")
+
+        try:
+            now = time.time()
+            since = min(window.bucket(now - window.window_seconds) for window in windows)
+            shared = get_window_counts(since)
+        except Exception as e:
+            print(f"Error flushing alert windows: {e}")
+            return
+
+        with self._lock:
+            for window in windows:
+                window.shared = shared.get(window.id, {})
+                self._evaluate(window, now)
+            transitions, self._transitions = self._transitions, []
+        for rule_id, state, at, value in transitions:
+            try:
+                set_alert_state(rule_id, state, at, value)
+            except Exception as e:
+                print(f"Error recording alert state: {e}")
+
+    def _evaluate(self, window, now):
+        # Caller holds the lock
+        value = window.count(now)
+        firing = value > window.threshold
+        if firing == window.firing:
+            return
+        window.firing = firing
+        at = datetime.datetime.utcnow()
+        window.firing_since = at if firing else None
+        self._transitions.append((window.id, "firing" if firing else "ok", at, value))
+
+    def _seed(self, window):
+        now = time.time()
+        start = window.bucket(now - window.window_seconds)
+        counts = get_log_bucket_counts(
+            build_logs_filter(
+                level=window.rule.get("level"), user_id=window.rule.get("userId"),
+                tag=window.rule.get("tag"), search=window.rule.get("search")
+            ),
+            datetime.datetime.utcfromtimestamp(start),
+            window.bucket_seconds
+        )
+        # The current bucket is still being counted live
+        current = window.bucket(now)
+        counts = {bucket: count for bucket, count in counts.items() if bucket < current}
+        if counts:
+            seed_window_counts(window.id, counts, self._expire_at(window, current))
+        window.seeded = True
+
+    def _expire_at(self, window, bucket):
+        return datetime.datetime.utcfromtimestamp(bucket + window.window_seconds + window.bucket_seconds)
+
+    def _ensure_rules(self):
+        now = time.monotonic()
+        if self._rules_loaded_at is not None and now - self._rules_loaded_at < self.rules_refresh_seconds:
+            return
+        try:
+            rules = get_alert_rules()
+        except Exception as e:
+            print(f"Error loading alert rules: {e}")
+            rules = None
+        with self._lock:
+            self._rules_loaded_at = now
+            if rules is None:
+                return
+            current = {}
+            for rule in rules:
+                window = self._rules.get(rule["id"])
+                if window is None:
+                    try:
+                        window = _RuleWindow(rule)
+                    except Exception as e:
+                        print(f"Skipping alert rule {rule.get('id')}: {e}")
+                        continue
+                else:
+                    window.rule = rule
+                    # Another process may have recorded the episode first
+                    if window.firing and rule.get("firingSince"):
+                        window.firing_since = rule["firingSince"]
+                current[rule["id"]] = window
+            self._rules = current
+
+    def _refresh_and_flush(self):
+        self._ensure_rules()
+        self.flush()
+
+
+alert_engine = AlertEngine(flush_seconds=alert_flush_seconds, rules_refresh_seconds=alert_rules_refresh_seconds)
@@ -0,0 +1,378 @@
+import contextlib
+import datetime
+import fcntl
+import gzip
+import heapq
+import json
+import os
+import re
+import threading
+import uuid
+from collections import Counter
+
+import msgpack
+from dotenv import load_dotenv
+
+load_dotenv()
+
+archive_dir = os.getenv("ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "archive"))
+# Tag and user summaries stop listing values past this many, and are then not used for pruning
+SUMMARY_MAX_VALUES = 256
+
+
+def _to_naive(timestamp):
+    # Segments store UTC timestamps; MongoDB hands them back naive UTC, so match that
+    if isinstance(timestamp, datetime.datetime) and timestamp.tzinfo is not None:
+        return timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def _regex(condition):
+    flags = re.IGNORECASE if "i" in condition.get("$options", "") else 0
+    return re.compile(condition["$regex"], flags)
+
+
+def _matches_value(value, condition):
+    if isinstance(value, list):
+        # Like MongoDB, a condition on an array field matches if any element does
+        return any(_matches_value(element, condition) for element in value) or value == condition
+    if isinstance(condition, dict) and any(key.startswith("$") for key in condition):
+        for operator, operand in condition.items():
+            if operator == "$in":
+                if value not in operand:
+                    return False
+            elif operator == "$regex":
+                if not isinstance(value, str) or not _regex(condition).search(value):
+                    return False
+            elif operator == "$exists":
+                if (value is not None) != bool(operand):
+                    return False
+            elif operator in ("$gte", "$gt", "$lte", "$lt"):
+                if isinstance(operand, datetime.datetime) and operand.tzinfo is not None:
+                    operand = operand.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+                if value is None or type(value) is not type(operand):
+                    return False
+                if operator == "$gte" and not value >= operand:
+                    return False
+                if operator == "$gt" and not value > operand:
+                    return False
+                if operator == "$lte" and not value <= operand:
+                    return False
+                if operator == "$lt" and not value < operand:
+                    return False
+            elif operator == "$options":
+                continue
+            else:
+                raise ValueError(f"Unsupported operator in archive query: {operator}")
+        return True
+    return value == condition
+
+
+def matches_query(doc, query):
+    """
+    Evaluate the subset of MongoDB query syntax the repository builds
+    (equality, $in, $regex, $exists, range operators and $or) against a document
+    """
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(matches_query(doc, clause) for clause in condition):
+                return False
+        elif not _matches_value(doc.get(field), condition):
+            return False
+    return True
+
+
+def _timestamp_key(doc):
+    timestamp = doc.get("timestamp")
+    return timestamp if isinstance(timestamp, datetime.datetime) else datetime.datetime.min
+
+
+class SegmentStore:
+    """
+    Cold tier of compressed, time-ordered log segments on local disk.
+
+    Each segment is a gzip-compressed stream of MessagePack log documents, newest
+    first. index.json lists every segment with its time range, count and level,
+    tag and user summaries, so queries only open the segments that can match.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.json")
+        self._index = {"archivedBefore": None, "segments": []}
+        self._index_mtime = None
+        self._lock = threading.Lock()
+
+    def archived_before(self):
+        """Return the cutoff below which logs may live in segments, or None"""
+        index = self._load_index()
+        return datetime.datetime.fromisoformat(index["archivedBefore"]) if index["archivedBefore"] else None
+
+    def segments(self):
+        return list(self._load_index()["segments"])
+
+    def write_segment(self, docs, shard=0):
+        """
+        Write docs (any order) as one segment and register it in the index as
+        pending deletion from MongoDB. Returns the segment's index entry
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"segment-{uuid.uuid4().hex}.msgpack.gz"
+        entry = {"file": name, "shard": shard, **self._write_file(name, docs), "pendingDelete": True}
+        with self._locked():
+            index = self._load_index(force=True)
+            index["segments"].append(entry)
+            self._save_index(index)
+        return entry
+
+    def purge_segments(self, query, start=None, end=None):
+        """
+        Remove the documents matching query from segments overlapping [start, end],
+        rewriting each affected segment in place. Yields the documents removed
+        from each rewritten segment, so callers can report progress between them
+        """
+        for entry in list(self._candidate_segments(query, start, end, include_pending=True)):
+            # Held for the whole rewrite so an archive run can't drop or replace the segment meanwhile
+            with self._locked():
+                index = self._load_index(force=True)
+                if not any(current["file"] == entry["file"] for current in index["segments"]):
+                    continue
+                keep, removed = [], []
+                for doc in self.iter_segment(entry):
+                    (removed if matches_query(doc, query) else keep).append(doc)
+                if not removed:
+                    continue
+                summary = self._write_file(entry["file"], keep) if keep else None
+                index["segments"] = [
+                    {**current, **summary} if current["file"] == entry["file"] else current
+                    for current in index["segments"]
+                    if current["file"] != entry["file"] or summary is not None
+                ]
+                self._save_index(index)
+                if summary is None:
+                    os.remove(os.path.join(self.directory, entry["file"]))
+            yield removed
+
+    def _write_file(self, name, docs):
+        """
+        Write docs newest first to the segment file name, replacing it atomically.
+        Returns the index fields describing its contents
+        """
+        docs = sorted(docs, key=_timestamp_key, reverse=True)
+        path = os.path.join(self.directory, name)
+
+        levels, tags, users = {}, {}, {}
+        packer = msgpack.Packer(datetime=True)
+        with gzip.open(path + ".tmp", "wb", compresslevel=6) as segment_file:
+            for doc in docs:
+                doc = dict(doc)
+                if "_id" in doc:
+                    doc["_id"] = str(doc["_id"])
+                timestamp = doc.get("timestamp")
+                if isinstance(timestamp, datetime.datetime) and timestamp.tzinfo is None:
+                    doc["timestamp"] = timestamp.replace(tzinfo=datetime.timezone.utc)
+                for key in ("firstSeen", "lastSeen"):
+                    if isinstance(doc.get(key), datetime.datetime) and doc[key].tzinfo is None:
+                        doc[key] = doc[key].replace(tzinfo=datetime.timezone.utc)
+                segment_file.write(packer.pack(doc))
+                for summary, field in ((levels, "level"), (tags, "tag"), (users, "userId")):
+                    value = doc.get(field)
+                    if value is not None:
+                        summary[str(value)] = summary.get(str(value), 0) + doc.get("count", 1)
+            segment_file.flush()
+            os.fsync(segment_file.fileobj.fileno())
+        os.replace(path + ".tmp", path)
+
+        timestamps = [_timestamp_key(doc) for doc in docs if isinstance(doc.get("timestamp"), datetime.datetime)]
+        return {
+            "minTimestamp": _to_naive(min(timestamps)).isoformat() if timestamps else None,
+            "maxTimestamp": _to_naive(max(timestamps)).isoformat() if timestamps else None,
+            "count": len(docs),
+            "levels": levels,
+            "tags": tags if len(tags) <= SUMMARY_MAX_VALUES else None,
+            "users": users if len(users) <= SUMMARY_MAX_VALUES else None
+        }
+
+    def mark_deleted(self, file_name):
+        """Record that a segment's documents were removed from MongoDB"""
+        self._update_segments(lambda entry: entry["file"] == file_name, lambda entry: entry.update(pendingDelete=False))
+
+    def set_archived_before(self, cutoff):
+        with self._locked():
+            index = self._load_index(force=True)
+            current = index["archivedBefore"]
+            if current is None or cutoff.isoformat() > current:
+                index["archivedBefore"] = cutoff.isoformat()
+                self._save_index(index)
+
+    def drop_segments_before(self, cutoff, on_drop=None):
+        """
+        Delete segments whose newest log is older than cutoff; returns how many.
+        on_drop, when given, is called with each dropped segment's documents first
+        """
+        with self._locked():
+            index = self._load_index(force=True)
+            keep, dropped = [], []
+            for entry in index["segments"]:
+                old = entry["maxTimestamp"] and entry["maxTimestamp"] < cutoff.isoformat()
+                (dropped if old and not entry["pendingDelete"] else keep).append(entry)
+            index["segments"] = keep
+            self._save_index(index)
+        for entry in dropped:
+            if on_drop is not None:
+                on_drop(self.iter_segment(entry))
+            try:
+                os.remove(os.path.join(self.directory, entry["file"]))
+            except FileNotFoundError:
+                pass
+        return len(dropped)
+
+    def iter_segment(self, entry):
+        """Stream the documents of one segment, newest first"""
+        try:
+            segment_file = gzip.open(os.path.join(self.directory, entry["file"]), "rb")
+        except FileNotFoundError:
+            # Dropped by retention or emptied by a purge since the index was read
+            return
+        with segment_file:
+            for doc in msgpack.Unpacker(segment_file, raw=False, timestamp=3):
+                for key in ("timestamp", "firstSeen", "lastSeen"):
+                    if key in doc:
+                        doc[key] = _to_naive(doc[key])
+                yield doc
+
+    def query(self, query, start=None, end=None, limit=0):
+        """
+        Match query against segments overlapping [start, end]. Returns
+        (total matches, newest `limit` matching documents, newest first);
+        limit=0 returns every match
+        """
+        total = 0
+        per_segment = []
+        for entry in self._candidate_segments(query, start, end):
+            matched = []
+            for doc in self.iter_segment(entry):
+                if matches_query(doc, query):
+                    total += 1
+                    if not limit or len(matched) < limit:
+                        doc.pop("_id", None)
+                        matched.append(doc)
+            per_segment.append(matched)
+        merged = heapq.merge(*per_segment, key=_timestamp_key, reverse=True)
+        docs = []
+        for doc in merged:
+            docs.append(doc)
+            if limit and len(docs) >= limit:
+                break
+        return total, docs
+
+    def facet_counts(self, query, start=None, end=None):
+        """
+        Count archived logs matching query per level, tag and userId, weighted by
+        count. Segments that lie wholly inside [start, end] of a date-only query
+        are answered from their index summaries without being read
+        """
+        counts = {"total": 0, "level": Counter(), "tag": Counter(), "userId": Counter()}
+        date_only = set(query) <= {"timestamp"}
+        start_iso = _to_naive(start).isoformat() if start else None
+        end_iso = _to_naive(end).isoformat() if end else None
+        for entry in self._candidate_segments(query, start, end):
+            covered = (
+                date_only
+                and entry["tags"] is not None and entry["users"] is not None
+                and (start_iso is None or entry["minTimestamp"] >= start_iso)
+                and (end_iso is None or entry["maxTimestamp"] <= end_iso)
+            )
+            if covered:
+                counts["level"].update(entry["levels"])
+                counts["tag"].update(entry["tags"])
+                counts["userId"].update(entry["users"])
+                counts["total"] += sum(entry["levels"].values())
+                continue
+            for doc in self.iter_segment(entry):
+                if not matches_query(doc, query):
+                    continue
+                weight = doc.get("count", 1)
+                counts["total"] += weight
+                for field in ("level", "tag", "userId"):
+                    if doc.get(field) is not None:
+                        counts[field][str(doc[field])] += weight
+        return counts
+
+    def _candidate_segments(self, query, start, end, include_pending=False):
+        start_iso = _to_naive(start).isoformat() if start else None
+        end_iso = _to_naive(end).isoformat() if end else None
+        for entry in self._load_index()["segments"]:
+            # Pending segments are still in MongoDB; reading both would double count
+            if entry["maxTimestamp"] is None or (entry["pendingDelete"] and not include_pending):
+                continue
+            if start_iso and entry["maxTimestamp"] < start_iso:
+                continue
+            if end_iso and entry["minTimestamp"] > end_iso:
+                continue
+            if not self._summary_may_match(entry["levels"], query.get("level")):
+                continue
+            if not self._summary_may_match(entry["tags"], query.get("tag")):
+                continue
+            if not self._summary_may_match(entry["users"], query.get("userId")):
+                continue
+            yield entry
+
+    def _summary_may_match(self, summary, condition):
+        if summary is None or condition is None:
+            return True
+        values = summary.keys()
+        if isinstance(condition, dict):
+            if "$in" in condition:
+                return any(str(value) in summary for value in condition["$in"])
+            if "$regex" in condition:
+                pattern = _regex(condition)
+                return any(pattern.search(value) for value in values)
+            return True
+        return str(condition) in summary
+
+    def _update_segments(self, predicate, update):
+        with self._locked():
+            index = self._load_index(force=True)
+            for entry in index["segments"]:
+                if predicate(entry):
+                    update(entry)
+            self._save_index(index)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """
+        Serialize index updates across threads and processes (the archiver and
+        purge jobs in API workers both rewrite it)
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, open(os.path.join(self.directory, ".index.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_index(self, force=False):
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+        except FileNotFoundError:
+            return self._index
+        if force or mtime != self._index_mtime:
+            with open(self.index_path, "r", encoding="utf-8") as index_file:
+                self._index = json.load(index_file)
+            self._index_mtime = mtime
+        return self._index
+
+    def _save_index(self, index):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.index_path + ".tmp", "w", encoding="utf-8") as index_file:
+            json.dump(index, index_file, indent=1)
+            index_file.flush()
+            os.fsync(index_file.fileno())
+        os.replace(self.index_path + ".tmp", self.index_path)
+        self._index = index
+        self._index_mtime = os.stat(self.index_path).st_mtime_ns
+
+
+segment_store = SegmentStore(archive_dir)
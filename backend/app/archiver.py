@@ -0,0 +1,88 @@
+"""
+Moves logs older than ARCHIVE_AFTER_DAYS from MongoDB into compressed segment
+files (see app/archive.py) and drops segments past ARCHIVE_RETENTION_DAYS:
+
+    python -m app.archiver          # run once, e.g. from cron
+    python -m app.archiver --loop   # run every ARCHIVE_INTERVAL_MINUTES
+"""
+import datetime
+import os
+import sys
+import time
+
+from bson import ObjectId
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.archive import segment_store
+from app.cache import query_cache
+from app.db import shard_count
+from app.facets import facet_index
+from app.repositories.log_repository import find_logs_before, delete_logs_by_ids
+
+archive_after_days = float(os.getenv("ARCHIVE_AFTER_DAYS", "7"))
+archive_retention_days = float(os.getenv("ARCHIVE_RETENTION_DAYS", "90"))
+segment_max_logs = int(os.getenv("ARCHIVE_SEGMENT_MAX_LOGS", "50000"))
+archive_interval_minutes = float(os.getenv("ARCHIVE_INTERVAL_MINUTES", "60"))
+
+
+def _finish_pending_segments():
+    """
+    Delete from MongoDB the documents of segments written by a run that stopped
+    before removing them, so nothing is stored in both tiers
+    """
+    for entry in segment_store.segments():
+        if entry["pendingDelete"]:
+            ids = [ObjectId(doc["_id"]) for doc in segment_store.iter_segment(entry) if "_id" in doc]
+            delete_logs_by_ids(entry["shard"], ids)
+            segment_store.mark_deleted(entry["file"])
+
+
+def archive_old_logs(now=None):
+    """
+    Archive every log older than the hot tier threshold. Returns a summary
+    """
+    now = now or datetime.datetime.utcnow()
+    cutoff = now - datetime.timedelta(days=archive_after_days)
+    summary = {"segmentsWritten": 0, "logsArchived": 0, "segmentsDropped": 0}
+
+    _finish_pending_segments()
+    # Published first so queries already look in segments while the run is in progress
+    segment_store.set_archived_before(cutoff)
+
+    for shard in range(shard_count):
+        while True:
+            docs = find_logs_before(shard, cutoff, segment_max_logs)
+            if not docs:
+                break
+            entry = segment_store.write_segment(docs, shard=shard)
+            delete_logs_by_ids(shard, [doc["_id"] for doc in docs])
+            segment_store.mark_deleted(entry["file"])
+            summary["segmentsWritten"] += 1
+            summary["logsArchived"] += len(docs)
+
+    retention_cutoff = now - datetime.timedelta(days=archive_retention_days)
+    # Logs past retention are gone for good, so the facet dictionary stops counting them
+    summary["segmentsDropped"] = segment_store.drop_segments_before(retention_cutoff, on_drop=facet_index.forget)
+    # This runs outside the API workers, so their caches are dropped through the shared generation
+    query_cache.invalidate_everywhere()
+    return summary
+
+
+def main():
+    loop = "--loop" in sys.argv[1:]
+    while True:
+        try:
+            print(f"Archive run finished: {archive_old_logs()}")
+        except Exception as e:
+            print(f"Archive run failed: {e}")
+            if not loop:
+                sys.exit(1)
+        if not loop:
+            break
+        time.sleep(archive_interval_minutes * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import datetime
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict, deque
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.periodic import PeriodicTask
+from app.repositories.cache_repository import get_cache_state, publish_cache_write, bump_cache_generation
+
+query_cache_max_entries = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "512"))
+query_cache_ttl_seconds = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "30"))
+# How often each process publishes its writes to, and picks up other processes' writes
+# and archive/purge runs from, the shared generation
+query_cache_sync_seconds = float(os.getenv("QUERY_CACHE_SYNC_SECONDS", "1"))
+
+
+class QueryCache:
+    """
+    Bounded LRU cache for read query results, invalidated by an ingest watermark.
+
+    Every entry remembers the timestamp range it covers. A write only drops the
+    entries whose range contains the written timestamp, so pages that lie
+    entirely before the newest write stay cached. Open-ended entries (no upper
+    bound) are dropped by any write. Entries stored with track_writes=False are
+    only removed by explicit invalidation, LRU eviction or TTL.
+
+    Writes are also published, merged into one range per sync_seconds, to a
+    generation shared through MongoDB. Each process checks it every sync_seconds
+    and applies the ranges other processes wrote, so ingest handled by another
+    worker (or the ingest listener) drops the same entries. Deletions made by
+    archive and purge runs bump the generation without a range, which drops
+    every entry.
+
+    A value computed while a covering write arrived is returned but not stored,
+    so a page read before the write can't be cached as fresh.
+    """
+
+    def __init__(self, max_entries=512, ttl_seconds=30, sync_seconds=1):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.sync_seconds = sync_seconds
+        self._shared_generation = None
+        self._synced_at = None
+        self._origin = None
+        self._origin_pid = None
+        self._pending_write = None
+        self._publisher = PeriodicTask("query-cache-publish", sync_seconds, self.publish_writes)
+        # (generation, lower, upper) of recent writes, to check puts computed across them
+        self._recent_writes = deque(maxlen=256)
+        # Bumped by every invalidate(), so a put computed across one is refused
+        self._cleared = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._watermark = None
+        # Largest upper bound among cached bounded entries, lets a write skip the scan
+        self._max_bounded_upper = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        self._sync_shared_generation()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self._is_fresh(entry):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["value"]
+
+    def snapshot(self):
+        """Return a token of the cache's write state, to pass to put() after computing"""
+        with self._lock:
+            return self._cleared, self._generation
+
+    def put(self, key, value, lower=None, upper=None, track_writes=True, since=None):
+        """
+        Store value for key, covering the [lower, upper] timestamp range. With since
+        (a snapshot() taken before computing value), nothing is stored if the cache
+        was invalidated or a write the entry covers happened in between.
+        """
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            generation = self._generation
+            if since is not None:
+                if not self._unchanged_since(since, lower, upper, track_writes):
+                    return
+                generation = since[1]
+            self._entries[key] = {
+                "value": value,
+                "lower": lower,
+                "upper": upper,
+                "track_writes": track_writes,
+                "generation": generation,
+                "stored_at": time.monotonic()
+            }
+            self._entries.move_to_end(key)
+            if track_writes and upper is not None:
+                if self._max_bounded_upper is None or upper > self._max_bounded_upper:
+                    self._max_bounded_upper = upper
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute, lower=None, upper=None, track_writes=True):
+        """Return the cached value for key, computing and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            since = self.snapshot()
+            value = compute()
+            self.put(key, value, lower=lower, upper=upper, track_writes=track_writes, since=since)
+        return value
+
+    def record_write(self, timestamp):
+        """
+        Advance the ingest watermark, drop entries the write could change and
+        queue it for the other processes
+        """
+        self._apply_write(timestamp, timestamp)
+        if self.sync_seconds <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            if self._pending_write is None:
+                self._pending_write = (timestamp, timestamp)
+            else:
+                lower, upper = self._pending_write
+                self._pending_write = (min(lower, timestamp), max(upper, timestamp))
+        self._publisher.ensure_started()
+
+    def publish_writes(self):
+        """Publish the range of writes recorded since the last call to the shared generation"""
+        with self._lock:
+            pending, self._pending_write = self._pending_write, None
+        if pending is None:
+            return
+        lower, upper = pending
+        try:
+            # MongoDB keeps milliseconds, so round the upper bound up rather than down
+            publish_cache_write(self._process_origin(), lower, upper + datetime.timedelta(milliseconds=1))
+        except Exception as e:
+            print(f"Error publishing query cache writes: {e}")
+            with self._lock:
+                if self._pending_write is not None:
+                    lower, upper = min(lower, self._pending_write[0]), max(upper, self._pending_write[1])
+                self._pending_write = (lower, upper)
+
+    def invalidate(self, key=None):
+        """Drop one entry, or every entry when no key is given"""
+        with self._lock:
+            self._cleared += 1
+            if key is None:
+                self._entries.clear()
+                self._max_bounded_upper = None
+            else:
+                self._entries.pop(key, None)
+
+    def invalidate_everywhere(self):
+        """Drop every entry in this process and, via the shared generation, in all others"""
+        try:
+            bump_cache_generation()
+        except Exception as e:
+            print(f"Error bumping the shared cache generation: {e}")
+        self.invalidate()
+
+    def _sync_shared_generation(self):
+        if self.sync_seconds <= 0 or self.max_entries <= 0:
+            return
+        now = time.monotonic()
+        if self._synced_at is not None and now - self._synced_at < self.sync_seconds:
+            return
+        self._synced_at = now
+        try:
+            generation, writes = get_cache_state()
+        except Exception as e:
+            print(f"Error reading the shared cache generation: {e}")
+            return
+        previous, self._shared_generation = self._shared_generation, generation
+        if previous is None or generation == previous:
+            return
+        missed = generation - previous
+        if missed < 0 or missed > len(writes):
+            # Too far behind to know what changed
+            self.invalidate()
+            return
+        origin = self._process_origin()
+        for write in writes[len(writes) - missed:]:
+            if write.get("origin") == origin:
+                continue
+            if write.get("lower") is None or write.get("upper") is None:
+                self.invalidate()
+                return
+            self._apply_write(write["lower"], write["upper"])
+
+    def _apply_write(self, lower, upper):
+        """Drop the entries a write anywhere in [lower, upper] could change"""
+        with self._lock:
+            self._generation += 1
+            self._recent_writes.append((self._generation, lower, upper))
+            if self._watermark is None or upper > self._watermark:
+                self._watermark = upper
+
+            # Writes newer than every bounded entry (the usual case) only affect
+            # open-ended entries, which the generation bump already invalidates
+            if self._max_bounded_upper is None or lower > self._max_bounded_upper:
+                return
+
+            self._max_bounded_upper = None
+            for key, entry in list(self._entries.items()):
+                if not entry["track_writes"] or entry["upper"] is None:
+                    continue
+                if entry["upper"] >= lower and (entry["lower"] is None or entry["lower"] <= upper):
+                    del self._entries[key]
+                elif self._max_bounded_upper is None or entry["upper"] > self._max_bounded_upper:
+                    self._max_bounded_upper = entry["upper"]
+
+    def _unchanged_since(self, since, lower, upper, track_writes):
+        # Caller holds the lock
+        cleared, generation = since
+        if cleared != self._cleared:
+            return False
+        if not track_writes or generation == self._generation:
+            return True
+        if upper is None:
+            return False
+        newer = [write for write in self._recent_writes if write[0] > generation]
+        if len(newer) < self._generation - generation:
+            # Older writes fell out of the log, so one of them may have covered the entry
+            return False
+        return not any(
+            write_lower <= upper and (lower is None or write_upper >= lower)
+            for _, write_lower, write_upper in newer
+        )
+
+    def _process_origin(self):
+        # Identifies this process's own writes when they come back through the shared generation
+        pid = os.getpid()
+        if self._origin_pid != pid:
+            self._origin = f"{socket.gethostname()}:{pid}"
+            self._origin_pid = pid
+        return self._origin
+
+    def stats(self):
+        """Return hit/miss counters and the current watermark"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "watermark": self._watermark.isoformat() if self._watermark else None
+            }
+
+    def _is_fresh(self, entry):
+        if self.ttl_seconds > 0 and time.monotonic() - entry["stored_at"] > self.ttl_seconds:
+            return False
+        if entry["track_writes"] and entry["upper"] is None:
+            return entry["generation"] == self._generation
+        return True
+
+
+query_cache = QueryCache(
+    max_entries=query_cache_max_entries,
+    ttl_seconds=query_cache_ttl_seconds,
+    sync_seconds=query_cache_sync_seconds
+)
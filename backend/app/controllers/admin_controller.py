@@ -0,0 +1,161 @@
+import datetime
+from app.admission import ingest_admission
+from app.cache import query_cache
+from app.flood_control import flood_control
+from app.purge import (
+    build_purge_query, new_runner_id, start_purge_runner, stale_before, take_over_purge_job,
+    purge_batch_size, purge_max_batch_size, purge_docs_per_second, purge_max_docs_per_second
+)
+from app.repositories.purge_repository import create_purge_job, get_purge_job, get_purge_jobs, update_purge_job
+
+def get_ingest_stats_controller():
+    """
+    Get ingest admission, flood control and query cache counters for this worker process
+    """
+    try:
+        return {
+            "admission": ingest_admission.stats(),
+            "floodControl": flood_control.stats(),
+            "queryCache": query_cache.stats()
+        }
+    except Exception as e:
+        raise Exception(f"Error getting ingest stats: {str(e)}")
+
+def _split_list(value):
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(',') if item.strip()]
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        return value
+    raise ValueError("levels and tags must be comma-separated strings or lists of strings")
+
+def _format_purge_job(job):
+    """
+    Shape a purge job for the API, with progress and ETA. A running job whose
+    runner stopped reporting is shown as stalled until a worker takes it over
+    """
+    matched = job.get("matched")
+    deleted = job.get("deleted", 0)
+    rate = job.get("docsPerSecond")
+    remaining = max(0, matched - deleted) if matched is not None else None
+    state = job["state"]
+    if state == "running" and job.get("heartbeatAt") and job["heartbeatAt"] < stale_before():
+        state = "stalled"
+    eta = None
+    if state == "running" and remaining is not None and rate:
+        eta = round(remaining / rate, 1)
+    formatted = {
+        "id": str(job["_id"]),
+        "state": state,
+        "filters": job["filters"],
+        "batchSize": job["batchSize"],
+        "docsPerSecondLimit": job["docsPerSecondLimit"],
+        "matched": matched,
+        "deleted": deleted,
+        "remaining": remaining,
+        "progress": round(min(1.0, deleted / matched), 4) if matched else (1.0 if state == "completed" else 0.0),
+        "docsPerSecond": round(rate, 1) if rate else None,
+        "etaSeconds": eta,
+        "error": job.get("error")
+    }
+    for field in ("createdAt", "heartbeatAt", "finishedAt"):
+        formatted[field] = job[field].isoformat() if job.get(field) else None
+    return formatted
+
+def create_purge_job_controller(data):
+    """
+    Validate a purge request with the Logs Table filters and start it as a background job
+    """
+    if not data or not isinstance(data, dict):
+        raise ValueError("Invalid purge request")
+
+    filters = {}
+    for field in ("levels", "tags"):
+        values = _split_list(data[field]) if data.get(field) else None
+        if values:
+            filters[field] = values
+    for field in ("userId", "startDate", "endDate", "search"):
+        if data.get(field):
+            if not isinstance(data[field], str):
+                raise ValueError(f"{field} must be a string")
+            filters[field] = data[field]
+    # An empty filter deletes every log, so it has to be asked for explicitly
+    if not filters and data.get("all") is not True:
+        raise ValueError("Provide at least one filter, or \"all\": true to purge every log")
+    build_purge_query(filters)
+
+    batch_size = data.get("batchSize", purge_batch_size)
+    if not isinstance(batch_size, int) or isinstance(batch_size, bool) or not 0 < batch_size <= purge_max_batch_size:
+        raise ValueError(f"batchSize must be an integer between 1 and {purge_max_batch_size}")
+    docs_per_second = data.get("docsPerSecond", purge_docs_per_second)
+    if not isinstance(docs_per_second, (int, float)) or isinstance(docs_per_second, bool) or not 1 <= docs_per_second <= purge_max_docs_per_second:
+        raise ValueError(f"docsPerSecond must be a number between 1 and {purge_max_docs_per_second:g}")
+
+    try:
+        runner_id = new_runner_id()
+        job = create_purge_job({
+            "state": "running",
+            "filters": filters,
+            "batchSize": batch_size,
+            "docsPerSecondLimit": docs_per_second,
+            "runnerId": runner_id,
+            "matched": None,
+            "deleted": 0,
+            "upperIds": None,
+            "cursors": {},
+            "shardsDone": [],
+            "heartbeatAt": datetime.datetime.utcnow()
+        })
+        start_purge_runner(job["_id"], runner_id)
+        return _format_purge_job(job)
+    except Exception as e:
+        raise Exception(f"Error starting purge job: {str(e)}")
+
+def get_purge_jobs_controller():
+    """
+    Get the most recent purge jobs with their progress
+    """
+    try:
+        return {"jobs": [_format_purge_job(job) for job in get_purge_jobs()]}
+    except Exception as e:
+        raise Exception(f"Error getting purge jobs: {str(e)}")
+
+def get_purge_job_controller(job_id):
+    """
+    Get one purge job with its progress, or None if it doesn't exist
+    """
+    try:
+        job = get_purge_job(job_id)
+        return _format_purge_job(job) if job else None
+    except Exception as e:
+        raise Exception(f"Error getting purge job: {str(e)}")
+
+def control_purge_job_controller(job_id, action):
+    """
+    Pause, resume or cancel a purge job. Returns the updated job, None if it
+    doesn't exist, and raises ValueError if the job can't take the action
+    """
+    job = get_purge_job(job_id)
+    if job is None:
+        return None
+
+    if action == "pause":
+        updated = update_purge_job(job_id, {"state": "paused"}, states=["running"])
+    elif action == "cancel":
+        updated = update_purge_job(
+            job_id, {"state": "cancelled", "finishedAt": datetime.datetime.utcnow()}, states=["running", "paused"]
+        )
+    elif action == "resume":
+        runner_id = new_runner_id()
+        resume = {"state": "running", "runnerId": runner_id, "heartbeatAt": datetime.datetime.utcnow()}
+        updated = update_purge_job(job_id, resume, states=["paused"])
+        if updated is not None:
+            start_purge_runner(job_id, runner_id)
+        else:
+            # A stalled job is taken over by this process without waiting for the sweep
+            updated = take_over_purge_job(job_id)
+    else:
+        raise ValueError(f"Unknown purge job action: {action}")
+
+    if updated is None:
+        raise ValueError(f"Cannot {action} a purge job that is {_format_purge_job(job)['state']}")
+    return _format_purge_job(updated)
@@ -0,0 +1,114 @@
+import os
+import re
+from app.alerting import alert_engine
+from app.repositories.alert_repository import create_alert_rule, get_alert_rules, delete_alert_rule
+from app.repositories.log_repository import build_logs_filter
+
+ALERT_MAX_WINDOW_SECONDS = int(os.getenv("ALERT_MAX_WINDOW_SECONDS", "86400"))
+ALERT_RULE_FILTERS = ("level", "userId", "tag", "search")
+# build_logs_filter argument for each rule filter
+_FILTER_ARGUMENTS = {"level": "level", "userId": "user_id", "tag": "tag", "search": "search"}
+
+def _regexes(query):
+    """
+    Yield every $regex pattern in a query
+    """
+    if isinstance(query, dict):
+        if "$regex" in query:
+            yield query["$regex"]
+        for value in query.values():
+            yield from _regexes(value)
+    elif isinstance(query, list):
+        for value in query:
+            yield from _regexes(value)
+
+def _check_filter_patterns(field, value):
+    """
+    Reject a rule filter whose regex wouldn't compile, which would otherwise only
+    fail once the rule is matched against ingested logs
+    """
+    query = build_logs_filter(**{_FILTER_ARGUMENTS[field]: value}, stored=False)
+    for pattern in _regexes(query):
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            raise ValueError(f"{field} is not a valid regular expression: {e}")
+
+def _format_timestamps(rule):
+    for field in ("firingSince", "lastFiredAt", "createdAt"):
+        if rule.get(field) is not None:
+            rule[field] = rule[field].isoformat()
+    return rule
+
+def get_alerts_controller(state=None):
+    """
+    Get every alert rule with its current windowed count and firing state
+    """
+    try:
+        alerts = alert_engine.alerts()
+        if state:
+            alerts = [alert for alert in alerts if alert["state"] == state]
+        return {"alerts": [_format_timestamps(alert) for alert in alerts]}
+    except Exception as e:
+        raise Exception(f"Error getting alerts: {str(e)}")
+
+def get_alert_rules_controller():
+    """
+    Get all stored alert rules
+    """
+    try:
+        return {"rules": [_format_timestamps(rule) for rule in get_alert_rules()]}
+    except Exception as e:
+        raise Exception(f"Error getting alert rules: {str(e)}")
+
+def create_alert_rule_controller(data):
+    """
+    Validate and store an alert rule: a Logs Table filter (level, userId, tag,
+    search) that fires when more than threshold matching logs arrive within
+    windowSeconds
+    """
+    if not data or not isinstance(data, dict):
+        raise ValueError("Invalid alert rule")
+
+    name = data.get("name")
+    if not name or not isinstance(name, str):
+        raise ValueError("Missing required field: name")
+
+    threshold = data.get("threshold")
+    if not isinstance(threshold, int) or isinstance(threshold, bool) or threshold < 0:
+        raise ValueError("threshold must be a non-negative integer")
+
+    window_seconds = data.get("windowSeconds")
+    if not isinstance(window_seconds, int) or isinstance(window_seconds, bool) or not 0 < window_seconds <= ALERT_MAX_WINDOW_SECONDS:
+        raise ValueError(f"windowSeconds must be an integer between 1 and {ALERT_MAX_WINDOW_SECONDS}")
+
+    rule = {"name": name, "threshold": threshold, "windowSeconds": window_seconds}
+    for field in ALERT_RULE_FILTERS:
+        value = data.get(field)
+        if value is None or value == "":
+            continue
+        if field in ("level", "tag") and isinstance(value, list):
+            if not value or not all(isinstance(item, str) for item in value):
+                raise ValueError(f"{field} must be a string or a list of strings")
+        elif not isinstance(value, str):
+            raise ValueError(f"{field} must be a string")
+        _check_filter_patterns(field, value)
+        rule[field] = value
+
+    try:
+        created = create_alert_rule(rule)
+    except Exception as e:
+        raise Exception(f"Error creating alert rule: {str(e)}")
+    alert_engine.reload_rules()
+    return _format_timestamps(created)
+
+def delete_alert_rule_controller(rule_id):
+    """
+    Delete an alert rule; returns False if it doesn't exist
+    """
+    try:
+        deleted = delete_alert_rule(rule_id)
+    except Exception as e:
+        raise Exception(f"Error deleting alert rule: {str(e)}")
+    alert_engine.reload_rules()
+    return deleted
@@ -1,10 +1,37 @@
 import datetime
+from collections import Counter
+from bson import ObjectId
+from bson.errors import InvalidId
 from app.repositories.log_repository import (
     find_logs, insert_log, get_all_logs, get_recent_logs,
     get_total_logs_count, get_unique_users_count, get_error_logs_count,
     get_top_error_tag, get_recent_log_rate, get_peak_logs_info, get_hourly_log_activity,
-    get_logs_with_pagination, get_all_tags
+    get_monthly_log_activity, get_approx_dashboard_stats, get_approx_monthly_log_activity,
+    get_logs_with_pagination, get_table_facets, get_log_context, CONTEXT_SCOPES, get_all_tags, get_template_counts, increment_log_repeats, insert_logs
 )
+from app.repositories.template_repository import (
+    save_template, get_active_templates, get_templates_by_ids, get_template_lineage
+)
+from app.alerting import alert_engine, alerts_enabled
+from app.cache import query_cache
+from app.facets import facet_index, facets_enabled, FACET_FIELDS
+from app.flood_control import flood_control
+from app.log_validator import validate_log_record
+from app.template_miner import template_miner, template_mining_enabled, template_storage_mode, render_template
+
+TAGS_CACHE_KEY = ("tags",)
+
+def _flush_log_repeats(user_id, log_id, count, first_seen=None, last_seen=None):
+    """
+    Write collapsed repeats to their stored log and drop cached counts that include it
+    """
+    acknowledged = increment_log_repeats(user_id, log_id, count, first_seen, last_seen)
+    # first_seen is the stored log's own timestamp, which the cached ranges are keyed on
+    if first_seen is not None:
+        query_cache.record_write(first_seen)
+    return acknowledged
+
+flood_control.flush_callback = _flush_log_repeats
 
 def get_filtered_logs(user_id=None, level=None, start=None, end=None, tag=None, package_name=None):
     """
@@ -80,62 +107,136 @@ def create_log(data):
     """
     Validate and create a new log entry with all fields
     """
-    if not data:
-        raise ValueError("Invalid log data")
+    log_entry, flood_key = _prepare_log_entry(data)
+    if log_entry is None:
+        # Absorbed by flood control (collapsed repeat or sampled out)
+        return True
     
-    # Validate required fields
-    required_fields = ["userId", "level", "message", "timestamp"]
-    for field in required_fields:
-        if field not in data or data[field] is None:
-            raise ValueError(f"Missing required field: {field}")
+    acknowledged = insert_log(log_entry)
+    _after_insert(log_entry, flood_key)
+    return acknowledged
+
+def create_logs_batch(records):
+    """
+    Validate and store many log entries with one bulk write per shard.
+    Returns how many records were stored, absorbed by flood control, or invalid
+    """
+    entries = []
+    batch_keys = {}
+    absorbed = 0
+    invalid = 0
     
-    # Convert timestamp string to datetime object
-    timestamp_str = data["timestamp"]
-    try:
-        # Try to parse the timestamp string to datetime object
-        if isinstance(timestamp_str, str):
-            # Handle common timestamp formats
-            try:
-                # Try ISO format first (e.g., "2023-12-15T10:30:45" or "2023-12-15T10:30:45.123Z")
-                timestamp_dt = datetime.datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-            except ValueError:
-                try:
-                    # Try format: "YYYY-MM-DD HH:mm:ss"
-                    timestamp_dt = datetime.datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
-                except ValueError:
-                    try:
-                        # Try format: "YYYY-MM-DD HH:mm:ss.fff"
-                        timestamp_dt = datetime.datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S.%f")
-                    except ValueError:
-                        raise ValueError(f"Invalid timestamp format: {timestamp_str}. Expected formats: 'YYYY-MM-DD HH:mm:ss', 'YYYY-MM-DD HH:mm:ss.fff', or ISO format")
-        elif isinstance(timestamp_str, datetime.datetime):
-            # Already a datetime object
-            timestamp_dt = timestamp_str
-        else:
-            raise ValueError(f"Timestamp must be a string or datetime object, got {type(timestamp_str)}")
-    except Exception as e:
-        raise ValueError(f"Error parsing timestamp: {str(e)}")
+    for data in records:
+        try:
+            log_entry, flood_key = _prepare_log_entry(data)
+        except ValueError:
+            invalid += 1
+            continue
+        if log_entry is None:
+            absorbed += 1
+            continue
+        
+        # Repeats inside one batch are folded into the first entry before writing;
+        # sampled-in repeats are stored as entries of their own
+        stored = batch_keys.get(flood_key)
+        if stored and "sampleRate" not in log_entry:
+            first = stored[0]
+            first["count"] += 1
+            seen_at = _to_utc_naive(log_entry["timestamp"])
+            first_at = _to_utc_naive(first["timestamp"])
+            first["firstSeen"] = min(first.get("firstSeen", first_at), seen_at)
+            first["lastSeen"] = max(first.get("lastSeen", first_at), seen_at)
+            absorbed += 1
+            continue
+        batch_keys.setdefault(flood_key, []).append(log_entry)
+        entries.append(log_entry)
     
-    # Create log entry with all possible fields
-    log_entry = {
-        "userId": data["userId"],
-        "level": data["level"],
-        "message": data["message"],
-        "timestamp": timestamp_dt  # Store as datetime object
-    }
+    if entries:
+        insert_logs(entries)
+        for flood_key, stored in batch_keys.items():
+            for log_entry in stored:
+                _after_insert(log_entry, flood_key)
     
-    # Add optional fields if present
-    optional_fields = ["tag", "threadId", "processId", "packageName"]
-    for field in optional_fields:
-        if field in data and data[field] is not None:
-            log_entry[field] = data[field]
+    return {"stored": len(entries), "absorbed": absorbed, "invalid": invalid}
+
+def _prepare_log_entry(data):
+    """
+    Validate a log record and build the document to store. Returns
+    (log_entry, flood_key), or (None, None) when flood control absorbed it
+    """
+    log_entry = validate_log_record(data)
+    timestamp_dt = log_entry["timestamp"]
+    
+    # Alert rules count every accepted record, including repeats flood control absorbs
+    if alerts_enabled:
+        alert_engine.observe(log_entry)
+    if facets_enabled:
+        facet_index.record(log_entry, _to_utc_naive(timestamp_dt))
+    
+    # Collapse repeats of a log stored moments ago into that document
+    flood_key = (str(log_entry["userId"]), str(log_entry["level"]), str(log_entry.get("tag")), str(log_entry["message"]))
+    if flood_control.record_repeat(flood_key, _to_utc_naive(timestamp_dt)):
+        return None, None
+    
+    # Under a flood, keep only a sample of noisy levels and weight what is kept
+    sample_rate = flood_control.sample(log_entry["level"])
+    if sample_rate is None:
+        return None, None
+    log_entry["count"] = 1
+    if sample_rate < 1.0:
+        log_entry["count"] = round(1 / sample_rate)
+        log_entry["sampleRate"] = sample_rate
+    
+    if template_mining_enabled and isinstance(log_entry["message"], str):
+        _attach_template(log_entry)
+    
+    return log_entry, flood_key
+
+def _after_insert(log_entry, flood_key):
+    """
+    Open a flood control window for a stored log and invalidate affected cache entries
+    """
+    if "_id" in log_entry:
+        flood_control.open_window(flood_key, log_entry["_id"], log_entry["userId"], _to_utc_naive(log_entry["timestamp"]))
+    
+    # Advance the ingest watermark so cached pages covering this timestamp are dropped
+    query_cache.record_write(_to_utc_naive(log_entry["timestamp"]))
+    if "tag" in log_entry:
+        cached_tags = query_cache.get(TAGS_CACHE_KEY)
+        if cached_tags is not None and log_entry["tag"] not in cached_tags["tags"]:
+            query_cache.invalidate(TAGS_CACHE_KEY)
+
+def _attach_template(log_entry):
+    """
+    Assign the log's message to a mined template and record its parameters
+    """
+    try:
+        if not template_miner.loaded:
+            template_miner.load(get_active_templates())
+        
+        mined = template_miner.add_message(log_entry["message"])
+        if mined["isNew"]:
+            save_template(mined["templateId"], mined["template"], supersedes=mined["supersedes"])
+        
+        log_entry["templateId"] = mined["templateId"]
+        if mined["params"]:
+            log_entry["params"] = mined["params"]
         
-    return insert_log(log_entry)
+        # Only drop the message when it can be rebuilt exactly (whitespace included)
+        if template_storage_mode == "compact" and render_template(mined["template"], mined["params"]) == log_entry["message"]:
+            del log_entry["message"]
+    except Exception as e:
+        # Mining is an optimization; never reject a log because of it
+        print(f"Error mining log template: {e}")
+        log_entry.pop("templateId", None)
+        log_entry.pop("params", None)
 
-def get_dashboard_stats():
+def get_dashboard_stats(approx=False):
     """
     Get comprehensive dashboard statistics
     """
+    if approx:
+        return _get_approx_dashboard_stats()
     try:
         stats = {
             "errors": get_error_logs_count(),
@@ -155,44 +256,275 @@ def get_dashboard_stats():
     except Exception as e:
         raise Exception(f"Error getting dashboard stats: {str(e)}")
 
+def _get_approx_dashboard_stats():
+    """
+    Dashboard statistics with the full-history figures estimated from a sample.
+    logRate and the 24 hour chart are bounded queries and stay exact; unique
+    users come from the facet dictionary when it is complete
+    """
+    try:
+        estimates, sample = get_approx_dashboard_stats()
+        
+        user_ids = facet_index.values("userId") if facets_enabled else None
+        top_error_tag = estimates["topErrorTag"]
+        peak = estimates["peakLogs"]
+        errors = estimates["errors"]["value"]
+        stats = {
+            "errors": errors,
+            "totalLogs": estimates["totalLogs"]["value"],
+            "uniqueUsers": len(user_ids) if user_ids is not None else get_unique_users_count(),
+            "topErrorTag": {
+                "tag": top_error_tag["tag"],
+                "percentage": round(top_error_tag["value"] / errors * 100) if errors > 0 else 0
+            } if top_error_tag else {"tag": "none", "percentage": 0},
+            "logRate": get_recent_log_rate(),
+            "peakLogs": {"count": peak["value"], "time": peak["time"]} if peak else {"count": 0, "time": "00:00"}
+        }
+        
+        return {
+            "stats": stats,
+            "chartData": get_hourly_log_activity(),
+            "approximate": True,
+            # 95% confidence intervals of the estimated figures; other figures are exact
+            "estimates": {
+                "errors": {key: estimates["errors"][key] for key in ("low", "high")},
+                "totalLogs": {key: estimates["totalLogs"][key] for key in ("low", "high")},
+                "topErrorTag": {key: top_error_tag[key] for key in ("low", "high")} if top_error_tag else None,
+                "peakLogs": {key: peak[key] for key in ("low", "high")} if peak else None
+            },
+            "sample": sample
+        }
+    except Exception as e:
+        raise Exception(f"Error getting approximate dashboard stats: {str(e)}")
+
+def get_monthly_activity_controller(approx=False):
+    """
+    Get log counts per month for the chart, estimated from a sample with approx
+    """
+    try:
+        if approx:
+            return get_approx_monthly_log_activity()
+        return {**get_monthly_log_activity(), "approximate": False}
+    except Exception as e:
+        raise Exception(f"Error getting monthly log activity: {str(e)}")
+
 def get_logs_table_controller(page=1, limit=10, levels=None, user_id=None, tags=None, start_date=None, end_date=None, search=None):
     """
     Get logs for the logs table with pagination and filtering
     """
     try:
-        # Convert comma-separated strings to lists
-        if levels and isinstance(levels, str):
-            levels = [level.strip() for level in levels.split(',') if level.strip()]
-        
-        if tags and isinstance(tags, str):
-            tags = [tag.strip() for tag in tags.split(',') if tag.strip()]
+        levels, tags = _split_filter_lists(levels, tags)
         
         # Validate page and limit
         page = max(1, int(page) if isinstance(page, (str, int)) else 1)
         limit = min(100, max(1, int(limit) if isinstance(limit, (str, int)) else 10))  # Max 100 per page
         
-        result = get_logs_with_pagination(
-            page=page,
-            limit=limit,
-            level=levels,
-            user_id=user_id,
-            tag=tags,
-            start_date=start_date,
-            end_date=end_date,
-            search=search
-        )
+        start_dt = _parse_filter_date(start_date)
+        end_dt = _parse_filter_date(end_date)
+        cache_key = ("table",) + _table_filter_key(levels, tags, user_id, start_dt, end_dt, search) + (page, limit)
         
-        return result
+        return query_cache.get_or_compute(
+            cache_key,
+            lambda: get_logs_with_pagination(
+                page=page,
+                limit=limit,
+                level=levels,
+                user_id=user_id,
+                tag=tags,
+                start_date=start_date,
+                end_date=end_date,
+                search=search
+            ),
+            lower=start_dt,
+            upper=end_dt
+        )
         
     except Exception as e:
         raise Exception(f"Error getting logs table data: {str(e)}")
 
+def get_table_facets_controller(levels=None, user_id=None, tags=None, start_date=None, end_date=None, search=None, top_n=10, approx=False):
+    """
+    Get per-level, per-tag and per-user counts plus the total for the logs table filter
+    """
+    try:
+        levels, tags = _split_filter_lists(levels, tags)
+        top_n = min(50, max(1, int(top_n) if isinstance(top_n, (str, int)) else 10))
+        
+        start_dt = _parse_filter_date(start_date)
+        end_dt = _parse_filter_date(end_date)
+        cache_key = ("table-facets",) + _table_filter_key(levels, tags, user_id, start_dt, end_dt, search) + (top_n, approx)
+        
+        return query_cache.get_or_compute(
+            cache_key,
+            lambda: get_table_facets(
+                level=levels,
+                user_id=user_id,
+                tag=tags,
+                start_date=start_date,
+                end_date=end_date,
+                search=search,
+                top_n=top_n,
+                approx=approx
+            ),
+            lower=start_dt,
+            upper=end_dt
+        )
+    except Exception as e:
+        raise Exception(f"Error getting logs table facets: {str(e)}")
+
+def _split_filter_lists(levels, tags):
+    """
+    Convert comma-separated level and tag filters to lists
+    """
+    if levels and isinstance(levels, str):
+        levels = [level.strip() for level in levels.split(',') if level.strip()]
+    
+    if tags and isinstance(tags, str):
+        tags = [tag.strip() for tag in tags.split(',') if tag.strip()]
+    
+    return levels, tags
+
+def _table_filter_key(levels, tags, user_id, start_dt, end_dt, search):
+    """
+    Normalize a logs table filter set so equivalent requests share one cache entry
+    """
+    return (
+        tuple(sorted(level.lower() for level in levels)) if isinstance(levels, list) else levels,
+        tuple(sorted(tags)) if isinstance(tags, list) else tags,
+        user_id or None,
+        start_dt,
+        end_dt,
+        search or None
+    )
+
+def get_log_context_controller(log_id, before=20, after=20, scope="process"):
+    """
+    Get the logs around a log from the same user, process or thread, oldest
+    first. Returns None if the log doesn't exist
+    """
+    if scope not in CONTEXT_SCOPES:
+        raise ValueError(f"Invalid scope: {scope}. Must be one of: {list(CONTEXT_SCOPES)}")
+    try:
+        object_id = ObjectId(log_id)
+    except (InvalidId, TypeError):
+        return None
+    
+    try:
+        context = get_log_context(object_id, before=before, after=after, scope=scope)
+    except ValueError:
+        # The log has no value for the scope's fields
+        raise
+    except Exception as e:
+        raise Exception(f"Error getting log context: {str(e)}")
+    if context is None:
+        return None
+    
+    return {
+        "scope": scope,
+        "log": _format_context_log(context["log"]),
+        "before": [_format_context_log(log) for log in context["before"]],
+        "after": [_format_context_log(log) for log in context["after"]]
+    }
+
+def _format_context_log(log):
+    """
+    Shape a stored log for the context view, keeping millisecond timestamps
+    """
+    log["id"] = str(log.pop("_id"))
+    if isinstance(log.get("timestamp"), datetime.datetime):
+        log["timestamp"] = log["timestamp"].strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    for field in ("firstSeen", "lastSeen"):
+        if isinstance(log.get(field), datetime.datetime):
+            log[field] = log[field].isoformat()
+    for field in ("threadId", "processId", "packageName"):
+        log.setdefault(field, None)
+    return log
+
 def get_tags_controller():
     """
     Get all distinct tags for filter dropdown
     """
     try:
-        tags = get_all_tags()
-        return {"tags": tags}
+        # Once complete, the facet dictionary holds every tag in order without a distinct query
+        tags = facet_index.values("tag") if facets_enabled else None
+        if tags is not None:
+            return {"tags": tags}
+        
+        # New tags are detected in create_log, so ordinary writes don't invalidate this entry
+        return query_cache.get_or_compute(
+            TAGS_CACHE_KEY,
+            lambda: {"tags": get_all_tags()},
+            track_writes=False
+        )
+    except Exception as e:
+        raise Exception(f"Error getting tags: {str(e)}") 
+
+def get_facet_suggestions_controller(field, prefix="", limit=20):
+    """
+    Autocomplete values of a facet field (tags, userIds, packageNames) by prefix
+    """
+    if field not in FACET_FIELDS:
+        raise ValueError(f"Unknown facet field: {field}. Expected one of: {list(FACET_FIELDS)}")
+    try:
+        suggestions = facet_index.suggest(FACET_FIELDS[field], prefix=prefix or "", limit=limit)
+        for suggestion in suggestions:
+            if isinstance(suggestion["lastSeen"], datetime.datetime):
+                suggestion["lastSeen"] = suggestion["lastSeen"].isoformat()
+        return {"field": field, "prefix": prefix or "", "values": suggestions}
+    except Exception as e:
+        raise Exception(f"Error getting facet suggestions: {str(e)}")
+
+def _to_utc_naive(dt):
+    """
+    Convert a datetime to naive UTC, the form MongoDB returns it in
+    """
+    return dt.astimezone(datetime.timezone.utc).replace(tzinfo=None) if dt.tzinfo is not None else dt
+
+def _parse_filter_date(value):
+    """
+    Parse a table filter date into a naive UTC datetime, or None if missing/invalid
+    """
+    if not value:
+        return None
+    try:
+        return _to_utc_naive(datetime.datetime.fromisoformat(value.replace('Z', '+00:00')))
+    except ValueError:
+        return None
+
+def get_log_patterns_controller(start_date=None, end_date=None, limit=50):
+    """
+    Get log counts grouped by message template over a time range
+    """
+    try:
+        limit = min(500, max(1, int(limit) if isinstance(limit, (str, int)) else 50))
+        start_dt = _parse_filter_date(start_date)
+        end_dt = _parse_filter_date(end_date)
+        
+        def compute():
+            counts = get_template_counts(start_date=start_dt, end_date=end_dt)
+            
+            # Fold counts of generalized templates into the template that replaced them
+            lineage = get_template_lineage(list(counts))
+            merged = Counter()
+            for template_id, count in counts.items():
+                merged[lineage.get(template_id, template_id)] += count
+            
+            top = merged.most_common(limit)
+            templates = get_templates_by_ids([template_id for template_id, _ in top])
+            return {
+                "patterns": [
+                    {
+                        "templateId": template_id,
+                        "template": " ".join(templates.get(template_id, [])),
+                        "count": count
+                    }
+                    for template_id, count in top
+                ],
+                "totalPatterns": len(merged),
+                "totalLogs": sum(merged.values())
+            }
+        
+        return query_cache.get_or_compute(("patterns", start_dt, end_dt, limit), compute, lower=start_dt, upper=end_dt)
+        
     except Exception as e:
-        raise Exception(f"Error getting tags: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Error getting log patterns: {str(e)}")
@@ -1,5 +1,8 @@
+import hashlib
 import os
+import threading
 from pymongo import MongoClient
+from pymongo.read_preferences import Primary, PrimaryPreferred, SecondaryPreferred
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,6 +10,123 @@ load_dotenv()
 mongo_uri = os.getenv("MONGO_URI")
 db_name = os.getenv("MONGO_DB_NAME")
 
-client = MongoClient(mongo_uri)
-db = client[db_name]
+# Optional hash sharding of logs by userId across several MongoDB targets.
+# Shard 0 also holds settings and every other non-log collection.
+shard_uris = [uri.strip() for uri in os.getenv("MONGO_SHARD_URIS", "").split(",") if uri.strip()] or [mongo_uri]
+shard_count = len(shard_uris)
+
+# Connection pool settings, applied to every client this process creates
+mongo_client_options = {
+    "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+    "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+    "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000")),
+    "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+    "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000")),
+    "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000")),
+    "compressors": os.getenv("MONGO_COMPRESSORS", "zlib"),
+}
+
+# Read preferences for the handles below. Analytical reads tolerate replication
+# lag, so they go to secondaries whose lag is within maxStalenessSeconds (minimum 90);
+# live console reads prefer the primary and only fall back when it is unavailable.
+analytics_max_staleness = int(os.getenv("MONGO_ANALYTICS_MAX_STALENESS_SECONDS", "120"))
+read_preferences = {
+    "primary": Primary(),
+    "live": PrimaryPreferred(),
+    "analytics": SecondaryPreferred(max_staleness=analytics_max_staleness),
+}
+
+_clients = {}
+_client_pid = None
+_client_lock = threading.Lock()
+
+def get_client(shard=0):
+    """
+    Get the MongoClient for a shard in the current process, creating it on first use.
+    A client inherited across fork() is never reused, so each worker of a
+    pre-fork server opens its own connection pool.
+    """
+    global _clients, _client_pid
+    pid = os.getpid()
+    client = _clients.get(shard) if _client_pid == pid else None
+    if client is None:
+        with _client_lock:
+            if _client_pid != pid:
+                _clients = {}
+                _client_pid = pid
+            client = _clients.get(shard)
+            if client is None:
+                client = MongoClient(shard_uris[shard], connect=False, **mongo_client_options)
+                _clients[shard] = client
+    return client
+
+def get_db(shard=0):
+    """
+    Get the application database on a shard for the current process
+    """
+    return get_client(shard)[db_name]
+
+def close_client():
+    """
+    Close this process's clients, waiting for in-flight operations to return
+    """
+    global _clients, _client_pid
+    with _client_lock:
+        if _client_pid == os.getpid():
+            for client in _clients.values():
+                client.close()
+        _clients = {}
+        _client_pid = None
+
+def shard_for_user(user_id):
+    """
+    Get the shard index that stores logs for user_id
+    """
+    if shard_count == 1:
+        return 0
+    digest = hashlib.md5(str(user_id).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+
+class _LazyCollection:
+    """Collection handle that resolves against the current process's client on use"""
+
+    def __init__(self, name, read_preference=None, shard=0):
+        self._name = name
+        self._read_preference = read_preference
+        self._shard = shard
+
+    def __getattr__(self, attr):
+        collection = get_db(self._shard)[self._name]
+        if self._read_preference is not None:
+            collection = collection.with_options(read_preference=self._read_preference)
+        return getattr(collection, attr)
+
+
+class _LazyDatabase:
+    """Database handle that resolves against the current process's client on use"""
+
+    def __getitem__(self, name):
+        return _LazyCollection(name, read_preferences["primary"])
+
+    def reading(self, name, role, shard=0):
+        """Get a collection handle using the read preference registered for role"""
+        return _LazyCollection(name, read_preferences[role], shard)
+
+    def __getattr__(self, attr):
+        return getattr(get_db(), attr)
+
+
+db = _LazyDatabase()
+
+# Writes, settings and anything that must read its own writes use the primary
 logs_collection = db["logs"]
+# Read-only repository functions pick one of these per function
+logs_live_collection = db.reading("logs", "live")
+logs_analytics_collection = db.reading("logs", "analytics")
+
+# One handle per shard for each role; with a single target these hold one handle
+logs_shards = [db.reading("logs", "primary", shard) for shard in range(shard_count)]
+logs_live_shards = [db.reading("logs", "live", shard) for shard in range(shard_count)]
+logs_analytics_shards = [db.reading("logs", "analytics", shard) for shard in range(shard_count)]
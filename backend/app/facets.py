@@ -0,0 +1,248 @@
+"""
+Facet dictionary of tags, userIds and packageNames for autocomplete and
+userId filter resolution. For a database that already holds logs, build the
+dictionary from them once:
+
+    python -m app.facets --rebuild
+"""
+import bisect
+import datetime
+import os
+import re
+import sys
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.periodic import PeriodicTask
+from app.repositories.facet_repository import (
+    add_facet_counts, subtract_facet_counts, find_facet_values, merge_facet_rollup, get_facets,
+    is_facet_dictionary_complete, mark_facet_dictionary_complete
+)
+
+facets_enabled = os.getenv("FACETS_ENABLED", "true").lower() == "true"
+facet_flush_seconds = float(os.getenv("FACET_FLUSH_SECONDS", "2"))
+facet_refresh_seconds = float(os.getenv("FACET_REFRESH_SECONDS", "30"))
+# Partial filters matching more values than this fall back to a regex query
+facet_max_in_values = int(os.getenv("FACET_MAX_IN_VALUES", "500"))
+
+# API names of the dictionary's fields
+FACET_FIELDS = {"tags": "tag", "userIds": "userId", "packageNames": "packageName"}
+
+
+class FacetIndex:
+    """
+    Sorted in-memory copy of the facet dictionary.
+
+    Values seen at ingest are added to the sorted index immediately and their
+    counts are written to MongoDB by a background flush. Every refresh_seconds
+    the index picks up values other processes have written, and drops values
+    whose logs have all been purged or dropped by archive retention.
+    """
+
+    def __init__(self, fields, flush_seconds=2, refresh_seconds=30, max_in_values=500):
+        self.fields = tuple(fields)
+        self.flush_seconds = flush_seconds
+        self.refresh_seconds = refresh_seconds
+        self.max_in_values = max_in_values
+        self.complete = False
+        self._entries = {field: {} for field in self.fields}
+        self._sorted = {field: [] for field in self.fields}
+        self._pending = {}
+        self._loaded_at = None
+        self._refreshed_since = None
+        self._lock = threading.Lock()
+        self._flusher = PeriodicTask("facet-flush", flush_seconds, self.flush)
+
+    def record(self, log_entry, timestamp):
+        """Count the facet values of an accepted log"""
+        with self._lock:
+            for field in self.fields:
+                value = log_entry.get(field)
+                if not isinstance(value, str):
+                    continue
+                key = (field, value)
+                pending = self._pending.get(key)
+                if pending is None:
+                    self._pending[key] = [1, timestamp, timestamp]
+                else:
+                    pending[0] += 1
+                    pending[1] = min(pending[1], timestamp)
+                    pending[2] = max(pending[2], timestamp)
+                self._add(field, value, 1, timestamp)
+        self._flusher.ensure_started()
+
+    def suggest(self, field, prefix="", limit=20):
+        """Return up to limit values of field starting with prefix (case-insensitive), in order"""
+        self._ensure_loaded()
+        prefix = prefix.lower()
+        with self._lock:
+            keys = self._sorted[field]
+            start = bisect.bisect_left(keys, (prefix,))
+            suggestions = []
+            for lowered, value in keys[start:]:
+                if not lowered.startswith(prefix) or len(suggestions) >= limit:
+                    break
+                entry = self._entries[field][value]
+                suggestions.append({"value": value, "count": entry["count"], "lastSeen": entry["lastSeen"]})
+            return suggestions
+
+    def values(self, field):
+        """Return every known value of field in order, or None until the dictionary is complete"""
+        self._ensure_loaded()
+        if not self.complete:
+            return None
+        with self._lock:
+            return [value for _, value in self._sorted[field]]
+
+    def resolve(self, field, pattern):
+        """
+        Resolve a case-insensitive regex filter to the exact values it matches, for
+        an indexed $in query. Matches are read from the stored dictionary, which
+        every process flushes to within flush_seconds, plus the values this
+        process has seen. Returns None when the filter has to stay a regex: the
+        dictionary doesn't cover every log yet, or too many values match
+        """
+        self._ensure_loaded()
+        if not self.complete:
+            return None
+        try:
+            regex = re.compile(pattern, re.IGNORECASE)
+            matches = set(find_facet_values(field, pattern, self.max_in_values + 1))
+        except Exception as e:
+            print(f"Error resolving {field} filter through the facet dictionary: {e}")
+            return None
+        with self._lock:
+            matches.update(value for _, value in self._sorted[field] if regex.search(value))
+        return sorted(matches) if len(matches) <= self.max_in_values else None
+
+    def forget(self, docs):
+        """
+        Subtract deleted logs (purged, or dropped by archive retention) from the
+        dictionary, so values left without logs disappear from it
+        """
+        counts = {}
+        for doc in docs:
+            weight = doc["count"] if isinstance(doc.get("count"), (int, float)) else 1
+            for field in self.fields:
+                value = doc.get(field)
+                if isinstance(value, str):
+                    counts[(field, value)] = counts.get((field, value), 0) + weight
+        if not counts:
+            return
+        try:
+            subtract_facet_counts(counts)
+        except Exception as e:
+            # The logs are gone either way; the values only linger until the next rebuild
+            print(f"Error removing deleted logs from the facet dictionary: {e}")
+            return
+        with self._lock:
+            for (field, value), count in counts.items():
+                entry = self._entries[field].get(value)
+                if entry is None:
+                    continue
+                entry["count"] -= count
+                if entry["count"] <= 0:
+                    self._remove(field, value)
+
+    def flush(self):
+        """Write pending counts to the facet dictionary"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            add_facet_counts({key: tuple(counts) for key, counts in pending.items()})
+        except Exception as e:
+            print(f"Error flushing facet counts: {e}")
+
+    def _add(self, field, value, count, last_seen):
+        # Caller holds the lock
+        entry = self._entries[field].get(value)
+        if entry is None:
+            self._entries[field][value] = {"count": count, "lastSeen": last_seen}
+            bisect.insort(self._sorted[field], (value.lower(), value))
+            return
+        entry["count"] += count
+        if last_seen is not None and (entry["lastSeen"] is None or last_seen > entry["lastSeen"]):
+            entry["lastSeen"] = last_seen
+
+    def _remove(self, field, value):
+        # Caller holds the lock
+        if self._entries[field].pop(value, None) is None:
+            return
+        keys = self._sorted[field]
+        position = bisect.bisect_left(keys, (value.lower(), value))
+        if position < len(keys) and keys[position] == (value.lower(), value):
+            del keys[position]
+
+    def _ensure_loaded(self):
+        now = time.monotonic()
+        if self._loaded_at is not None and now - self._loaded_at < self.refresh_seconds:
+            return
+        self._loaded_at = now
+        started = time.time()
+        try:
+            complete = self.complete or is_facet_dictionary_complete()
+            since = self._refreshed_since
+            entries = get_facets(updated_since=since)
+        except Exception as e:
+            print(f"Error loading facet dictionary: {e}")
+            return
+        with self._lock:
+            self.complete = complete
+            for entry in entries:
+                field = entry["field"]
+                if field not in self._entries:
+                    continue
+                count = entry.get("count", 0)
+                known = self._entries[field].get(entry["value"])
+                if count <= 0:
+                    # Every log with this value was deleted
+                    self._remove(field, entry["value"])
+                elif known is None:
+                    self._add(field, entry["value"], count, entry.get("lastSeen"))
+                else:
+                    # Stored counts include this process's flushed ingest, but not what is still pending
+                    pending = self._pending.get((field, entry["value"]))
+                    known["count"] = count + (pending[0] if pending else 0)
+                    if entry.get("lastSeen") and (known["lastSeen"] is None or entry["lastSeen"] > known["lastSeen"]):
+                        known["lastSeen"] = entry["lastSeen"]
+            # Overlap refreshes a little so updates written during this read aren't missed
+            self._refreshed_since = datetime.datetime.utcfromtimestamp(started - self.refresh_seconds)
+
+
+def rebuild_facet_dictionary():
+    """
+    Build the dictionary from every stored log, then mark it complete so
+    /logs/tags and userId filters start reading it
+    """
+    from app.repositories.log_repository import get_facet_rollup
+
+    for field in FACET_FIELDS.values():
+        rollup = get_facet_rollup(field)
+        merge_facet_rollup(field, rollup)
+        print(f"Facet dictionary: {len(rollup)} {field} values")
+    mark_facet_dictionary_complete()
+
+
+facet_index = FacetIndex(
+    FACET_FIELDS.values(),
+    flush_seconds=facet_flush_seconds,
+    refresh_seconds=facet_refresh_seconds,
+    max_in_values=facet_max_in_values
+)
+
+
+def main():
+    if "--rebuild" not in sys.argv[1:]:
+        print(__doc__)
+        sys.exit(1)
+    rebuild_facet_dictionary()
+
+
+if __name__ == "__main__":
+    main()
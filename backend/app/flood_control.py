@@ -0,0 +1,172 @@
+import os
+import random
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.periodic import PeriodicTask
+
+dedup_window_seconds = float(os.getenv("INGEST_DEDUP_WINDOW_SECONDS", "10"))
+dedup_flush_seconds = float(os.getenv("INGEST_DEDUP_FLUSH_SECONDS", "1"))
+dedup_max_keys = int(os.getenv("INGEST_DEDUP_MAX_KEYS", "10000"))
+sample_threshold_per_second = float(os.getenv("INGEST_SAMPLE_THRESHOLD", "100"))
+
+
+def _parse_sample_rates(value):
+    """
+    Parse "debug=0.1,info=0.5" into {"debug": 0.1, "info": 0.5}. Each kept log
+    stands for 1 / rate logs in the stored counts, so a rate must be 0 or 1/n
+    for a whole n (0.5, 0.25, 0.1, ...); anything else is rejected rather than
+    rounded into a biased count
+    """
+    rates = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        level, rate = item.split("=", 1)
+        rate = min(1.0, max(0.0, float(rate)))
+        if rate > 0 and abs(1 / rate - round(1 / rate)) > 1e-6:
+            raise ValueError(f"INGEST_SAMPLE_RATES: {level.strip()}={rate} must be 1/n for a whole n, e.g. {1 / round(1 / rate):g}")
+        rates[level.strip().lower()] = rate
+    return rates
+
+
+sample_rates = _parse_sample_rates(os.getenv("INGEST_SAMPLE_RATES", ""))
+
+
+class FloodControl:
+    """
+    Collapses floods of identical logs and samples noisy levels at ingest.
+
+    The first log for a (userId, level, tag, message) key is stored normally and
+    opens a window. Repeats inside the window are not stored; their count and
+    latest timestamp are added to the stored document by a background flush.
+
+    When more than `sample_threshold` logs of one level arrive in a second, further
+    logs of that level are kept with the probability configured in `sample_rates`.
+    Each kept log is stored with its sampleRate and a count of 1 / sampleRate, so
+    summing count still estimates the original volume.
+    """
+
+    def __init__(self, window_seconds=10, flush_seconds=1, max_keys=10000, sample_rates=None, sample_threshold=100):
+        self.window_seconds = window_seconds
+        self.flush_seconds = flush_seconds
+        self.max_keys = max_keys
+        self.sample_rates = {str(level).lower(): rate for level, rate in (sample_rates or {}).items()}
+        self.sample_threshold = sample_threshold
+        self.flush_callback = None
+        self._windows = {}
+        self._level_rates = {}
+        self._lock = threading.Lock()
+        self._flusher = PeriodicTask("flood-control-flush", flush_seconds, self.flush)
+        self.collapsed = 0
+        self.sampled_out = 0
+
+    def record_repeat(self, key, timestamp):
+        """
+        Count a repeat of key if its window is still open. Returns True when the
+        log was absorbed and must not be stored.
+        """
+        if self.window_seconds <= 0:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window["opened"] > self.window_seconds:
+                return False
+            window["pending"] += 1
+            if window["last_seen"] is None or timestamp > window["last_seen"]:
+                window["last_seen"] = timestamp
+            self.collapsed += 1
+        self._flusher.ensure_started()
+        return True
+
+    def open_window(self, key, log_id, user_id, first_seen):
+        """Start collapsing repeats of key into the stored log log_id"""
+        if self.window_seconds <= 0:
+            return
+        with self._lock:
+            if len(self._windows) >= self.max_keys and key not in self._windows:
+                return
+            previous = self._windows.get(key)
+            if previous is not None and previous["pending"]:
+                # Keep the unflushed repeats of the expired window around until the next flush
+                self._windows[(key, previous["log_id"])] = previous
+            self._windows[key] = {
+                "log_id": log_id,
+                "user_id": user_id,
+                "opened": time.monotonic(),
+                "pending": 0,
+                "first_seen": first_seen,
+                "last_seen": None
+            }
+
+    def sample(self, level):
+        """
+        Decide whether a new log of this level is kept. Returns None to drop it,
+        otherwise the sample rate it was kept at (1.0 when not sampling).
+        """
+        # Levels are case-insensitive, so "ERROR" and "error" share a rate and a counter
+        level = str(level).lower()
+        rate = self.sample_rates.get(level)
+        if rate is None or rate >= 1.0:
+            return 1.0
+        second = int(time.monotonic())
+        with self._lock:
+            window_second, seen = self._level_rates.get(level, (second, 0))
+            if window_second != second:
+                window_second, seen = second, 0
+            seen += 1
+            self._level_rates[level] = (window_second, seen)
+            if seen <= self.sample_threshold:
+                return 1.0
+            if random.random() >= rate:
+                self.sampled_out += 1
+                return None
+        return rate
+
+    def flush(self):
+        """Write pending repeat counts through flush_callback and forget closed windows"""
+        now = time.monotonic()
+        pending = []
+        with self._lock:
+            for key, window in list(self._windows.items()):
+                if window["pending"]:
+                    pending.append((
+                        window["user_id"], window["log_id"], window["pending"],
+                        window["first_seen"], window["last_seen"]
+                    ))
+                    window["pending"] = 0
+                if now - window["opened"] > self.window_seconds:
+                    del self._windows[key]
+        if self.flush_callback is None:
+            return
+        for user_id, log_id, count, first_seen, last_seen in pending:
+            try:
+                self.flush_callback(user_id, log_id, count, first_seen, last_seen)
+            except Exception as e:
+                print(f"Error flushing collapsed log repeats: {e}")
+
+    def stats(self):
+        """Return dedup and sampling counters for this process"""
+        with self._lock:
+            return {
+                "collapsedRepeats": self.collapsed,
+                "sampledOut": self.sampled_out,
+                "openWindows": len(self._windows),
+                "windowSeconds": self.window_seconds,
+                "sampleRates": self.sample_rates,
+                "sampleThresholdPerSecond": self.sample_threshold
+            }
+
+
+flood_control = FloodControl(
+    window_seconds=dedup_window_seconds,
+    flush_seconds=dedup_flush_seconds,
+    max_keys=dedup_max_keys,
+    sample_rates=sample_rates,
+    sample_threshold=sample_threshold_per_second
+)
@@ -0,0 +1,313 @@
+"""
+Standalone ingest listener for syslog and newline-delimited JSON:
+
+    python -m app.ingest_listener
+
+- RFC 5424 syslog over UDP and TCP (newline or RFC 6587 octet-counted framing)
+- Newline-delimited JSON over TCP, one create_log record per line
+
+Records are queued and written to MongoDB in batches through create_logs_batch.
+When storage falls behind the queue fills up: TCP readers stop reading (the
+kernel then pushes back on senders) and UDP datagrams are dropped and counted.
+"""
+import asyncio
+import datetime
+import json
+import os
+import signal
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.alerting import alert_engine
+from app.controllers.log_controller import create_logs_batch
+from app.db import close_client
+from app.facets import facet_index
+from app.flood_control import flood_control
+
+listener_host = os.getenv("LISTENER_HOST", "0.0.0.0")
+syslog_udp_port = int(os.getenv("SYSLOG_UDP_PORT", "5514"))
+syslog_tcp_port = int(os.getenv("SYSLOG_TCP_PORT", "5514"))
+ndjson_tcp_port = int(os.getenv("NDJSON_TCP_PORT", "5515"))
+batch_size = int(os.getenv("LISTENER_BATCH_SIZE", "1000"))
+flush_interval = float(os.getenv("LISTENER_FLUSH_MS", "200")) / 1000
+queue_max = int(os.getenv("LISTENER_QUEUE_MAX", "50000"))
+writer_count = int(os.getenv("LISTENER_WRITERS", "2"))
+max_line_bytes = int(os.getenv("LISTENER_MAX_LINE_BYTES", "65536"))
+
+# Syslog severities 0-7 mapped onto LogTrail levels
+SEVERITY_LEVELS = ["error", "error", "error", "error", "warning", "info", "info", "debug"]
+
+# SD-ID whose params override the default field mapping, e.g.
+# [logtrail@32473 userId="u1" threadId="main" packageName="com.example.app"]
+LOGTRAIL_SD_ID = "logtrail@32473"
+SD_FIELDS = ("userId", "tag", "threadId", "processId", "packageName", "level")
+
+stats = {
+    "received": 0,
+    "stored": 0,
+    "absorbed": 0,
+    "invalid": 0,
+    "droppedUdp": 0,
+    "writeErrors": 0
+}
+
+
+def _nil(value):
+    return None if value == "-" else value
+
+
+def _parse_structured_data(text):
+    """
+    Parse the RFC 5424 STRUCTURED-DATA element at the start of text.
+    Returns (params of the LogTrail SD element, remaining text)
+    """
+    if not text.startswith("["):
+        return {}, text[2:] if text.startswith("- ") else ("" if text == "-" else text)
+
+    params = {}
+    i = 0
+    while i < len(text) and text[i] == "[":
+        end_id = text.find(" ", i)
+        close = text.find("]", i)
+        if close == -1:
+            return {}, text
+        sd_id = text[i + 1:close if end_id == -1 or close < end_id else end_id]
+        i = close if end_id == -1 or close < end_id else end_id
+        while i < len(text) and text[i] != "]":
+            if text[i] == " ":
+                i += 1
+                continue
+            eq = text.find("=", i)
+            if eq == -1:
+                return params, ""
+            name = text[i:eq]
+            # PARAM-VALUE is quoted; \", \\ and \] are escaped
+            j = eq + 2
+            value = []
+            while j < len(text) and text[j] != '"':
+                if text[j] == "\\" and j + 1 < len(text):
+                    j += 1
+                value.append(text[j])
+                j += 1
+            if sd_id == LOGTRAIL_SD_ID:
+                params[name] = "".join(value)
+            i = j + 1
+        i += 1
+    return params, text[i + 1:] if text[i:i + 1] == " " else text[i:]
+
+
+def parse_syslog(line, peer_host=None):
+    """
+    Map one RFC 5424 syslog message onto the create_log record schema:
+    HOSTNAME -> userId, APP-NAME -> tag, PROCID -> processId, severity -> level.
+    Lines that aren't RFC 5424 are stored whole as the message.
+    """
+    record = {
+        "userId": peer_host or "unknown",
+        "level": "info",
+        "timestamp": datetime.datetime.utcnow()
+    }
+
+    if line.startswith("<"):
+        close = line.find(">", 1, 5)
+        if close > 1 and line[1:close].isdigit():
+            record["level"] = SEVERITY_LEVELS[int(line[1:close]) % 8]
+            line = line[close + 1:]
+
+            # VERSION TIMESTAMP HOSTNAME APP-NAME PROCID MSGID STRUCTURED-DATA [MSG]
+            parts = line.split(" ", 6)
+            if len(parts) == 7 and parts[0].isdigit():
+                _, timestamp, hostname, app_name, proc_id, _, rest = parts
+                if _nil(timestamp):
+                    record["timestamp"] = timestamp
+                if _nil(hostname):
+                    record["userId"] = hostname
+                if _nil(app_name):
+                    record["tag"] = app_name
+                if _nil(proc_id):
+                    record["processId"] = proc_id
+                sd_params, message = _parse_structured_data(rest)
+                for field in SD_FIELDS:
+                    if field in sd_params:
+                        record[field] = sd_params[field]
+                # Strip the UTF-8 BOM RFC 5424 allows before MSG
+                record["message"] = message[1:] if message.startswith("\ufeff") else message
+                return record
+
+    record["message"] = line
+    return record
+
+
+def parse_ndjson(line):
+    """
+    Parse one JSON object in the create_log record format
+    """
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError("Each line must be a JSON object")
+    return record
+
+
+class _SyslogUdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, queue):
+        self.queue = queue
+
+    def datagram_received(self, data, addr):
+        stats["received"] += 1
+        try:
+            self.queue.put_nowait(parse_syslog(data.decode("utf-8", "replace").rstrip("\r\n"), addr[0]))
+        except asyncio.QueueFull:
+            # Datagrams can't be slowed down, so shed load instead of buffering without bound
+            stats["droppedUdp"] += 1
+
+
+async def _enqueue(queue, record):
+    if queue.full():
+        await queue.put(record)
+    else:
+        queue.put_nowait(record)
+
+
+async def _read_frames(reader):
+    """
+    Yield syslog frames from a TCP stream, detecting RFC 6587 octet counting
+    from the first byte of the connection
+    """
+    first = await reader.read(1)
+    if not first:
+        return
+    if first.isdigit():
+        pending = first
+        while True:
+            length = int(pending + (await reader.readuntil(b" "))[:-1])
+            if length > max_line_bytes:
+                raise ValueError(f"Syslog frame of {length} bytes exceeds the limit")
+            yield await reader.readexactly(length)
+            # Many senders end each counted frame with a newline as well; skip it
+            pending = await reader.read(1)
+            while pending.isspace():
+                pending = await reader.read(1)
+            if not pending:
+                return
+    else:
+        line = first + await reader.readline()
+        while line:
+            yield line
+            line = await reader.readline()
+
+
+async def _handle_syslog_tcp(reader, writer, queue):
+    peer_host = (writer.get_extra_info("peername") or ("unknown",))[0]
+    try:
+        async for frame in _read_frames(reader):
+            stats["received"] += 1
+            # Blocks while the queue is full, which stops reading from the socket
+            await _enqueue(queue, parse_syslog(frame.decode("utf-8", "replace").rstrip("\r\n"), peer_host))
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _handle_ndjson_tcp(reader, writer, queue):
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            stats["received"] += 1
+            try:
+                record = parse_ndjson(line)
+            except ValueError:
+                stats["invalid"] += 1
+                continue
+            await _enqueue(queue, record)
+    except (asyncio.LimitOverrunError, ValueError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _write_batches(queue):
+    """
+    Drain the queue into batches of up to batch_size records, flushing at least
+    every flush_interval, and store them off the event loop
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        deadline = time.monotonic() + flush_interval
+        while len(batch) < batch_size:
+            # Take whatever is already queued without a timer per record
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        try:
+            result = await loop.run_in_executor(None, create_logs_batch, batch)
+            stats["stored"] += result["stored"]
+            stats["absorbed"] += result["absorbed"]
+            stats["invalid"] += result["invalid"]
+        except Exception as e:
+            stats["writeErrors"] += 1
+            print(f"Error writing log batch: {e}")
+        finally:
+            for _ in batch:
+                queue.task_done()
+
+
+async def serve():
+    """
+    Run the listeners until SIGINT/SIGTERM, then drain the queue and exit
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=queue_max)
+
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: _SyslogUdpProtocol(queue), local_addr=(listener_host, syslog_udp_port)
+    )
+    syslog_server = await asyncio.start_server(
+        lambda r, w: _handle_syslog_tcp(r, w, queue), listener_host, syslog_tcp_port, limit=max_line_bytes
+    )
+    ndjson_server = await asyncio.start_server(
+        lambda r, w: _handle_ndjson_tcp(r, w, queue), listener_host, ndjson_tcp_port, limit=max_line_bytes
+    )
+    writers = [asyncio.create_task(_write_batches(queue)) for _ in range(writer_count)]
+    print(f"Listening for syslog on udp/tcp {syslog_udp_port} and NDJSON on tcp {ndjson_tcp_port}")
+
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    # Stop accepting, then let the writers store everything already queued
+    transport.close()
+    syslog_server.close()
+    ndjson_server.close()
+    await queue.join()
+    for task in writers:
+        task.cancel()
+    flood_control.flush()
+    alert_engine.flush()
+    facet_index.flush()
+    close_client()
+    print(f"Ingest listener stopped: {stats}")
+
+
+def main():
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
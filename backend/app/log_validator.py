@@ -0,0 +1,58 @@
+import datetime
+
+LOG_REQUIRED_FIELDS = ("userId", "level", "message", "timestamp")
+LOG_OPTIONAL_FIELDS = ("tag", "threadId", "processId", "packageName")
+
+_UTC = datetime.timezone.utc
+
+
+def parse_log_timestamp(value):
+    """
+    Parse a log timestamp: an ISO 8601 string (a space separator and a trailing Z
+    are accepted), a datetime, or epoch milliseconds as int/float
+    """
+    if isinstance(value, str):
+        try:
+            # Fast path: fromisoformat covers "YYYY-MM-DD HH:mm:ss[.fff]" and ISO,
+            # only the Z suffix needs rewriting on older Pythons
+            if value[-1:] in ("Z", "z"):
+                return datetime.datetime.fromisoformat(value[:-1] + "+00:00")
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            pass
+        try:
+            # Slow path for fractions fromisoformat rejects on Python < 3.11 (e.g. ".12")
+            return datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S.%f")
+        except ValueError:
+            raise ValueError(f"Error parsing timestamp: Invalid timestamp format: {value}. Expected formats: 'YYYY-MM-DD HH:mm:ss', 'YYYY-MM-DD HH:mm:ss.fff', or ISO format")
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            return datetime.datetime.fromtimestamp(value / 1000, tz=_UTC)
+        except (OverflowError, OSError, ValueError):
+            raise ValueError(f"Error parsing timestamp: epoch milliseconds out of range: {value}")
+    raise ValueError(f"Error parsing timestamp: Timestamp must be a string, datetime or epoch milliseconds, got {type(value)}")
+
+
+def validate_log_record(data):
+    """
+    Turn a raw log record into the document to store, in one pass over the
+    fields; raises ValueError on invalid records
+    """
+    if not data or not isinstance(data, dict):
+        raise ValueError("Invalid log data")
+
+    log_entry = {}
+    for field in LOG_REQUIRED_FIELDS:
+        value = data.get(field)
+        if value is None:
+            raise ValueError(f"Missing required field: {field}")
+        log_entry[field] = value
+    log_entry["timestamp"] = parse_log_timestamp(log_entry["timestamp"])
+
+    for field in LOG_OPTIONAL_FIELDS:
+        value = data.get(field)
+        if value is not None:
+            log_entry[field] = value
+    return log_entry
@@ -0,0 +1,40 @@
+import os
+import threading
+import time
+
+
+class PeriodicTask:
+    """
+    Calls target every interval seconds on a daemon thread.
+
+    The thread is started lazily by ensure_started() and tracked per process id,
+    so each forked worker starts its own instead of relying on one that only
+    exists in the parent.
+    """
+
+    def __init__(self, name, interval, target):
+        self.name = name
+        self.interval = interval
+        self.target = target
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        """Start the thread in this process if it isn't running yet"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+        threading.Thread(target=self._run, name=self.name, daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.target()
+            except Exception as e:
+                # One failed run must not stop the loop
+                print(f"Error in {self.name}: {e}")
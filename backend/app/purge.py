@@ -0,0 +1,223 @@
+import datetime
+import os
+import threading
+import time
+import uuid
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.archive import segment_store
+from app.cache import query_cache
+from app.db import shard_count
+from app.facets import facet_index, FACET_FIELDS
+from app.repositories.log_repository import (
+    build_logs_filter, get_newest_log_id, count_logs_on_shard, find_logs_after, delete_logs_by_ids
+)
+from app.periodic import PeriodicTask
+from app.repositories.purge_repository import get_purge_job, get_stalled_purge_jobs, update_purge_job, record_purge_progress
+
+purge_batch_size = int(os.getenv("PURGE_BATCH_SIZE", "500"))
+purge_max_batch_size = int(os.getenv("PURGE_MAX_BATCH_SIZE", "5000"))
+purge_docs_per_second = float(os.getenv("PURGE_DOCS_PER_SECOND", "2000"))
+purge_max_docs_per_second = float(os.getenv("PURGE_MAX_DOCS_PER_SECOND", "20000"))
+# A running job whose runner hasn't reported for this long (e.g. its worker exited) is stalled
+purge_stale_seconds = float(os.getenv("PURGE_STALE_SECONDS", "60"))
+# How often each worker looks for stalled jobs to take over
+purge_sweep_seconds = float(os.getenv("PURGE_SWEEP_SECONDS", "30"))
+
+
+def _parse_purge_date(value, field):
+    try:
+        parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (ValueError, AttributeError):
+        raise ValueError(f"Invalid {field}: {value}")
+    # Same comparison as the Logs Table, in naive UTC
+    return parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None) if parsed.tzinfo is not None else parsed
+
+
+def build_purge_query(filters):
+    """
+    Build the MongoDB query for a purge job's Logs Table filters. Unlike the table,
+    an unparseable date is an error rather than ignored
+    """
+    query = build_logs_filter(
+        level=filters.get("levels") or None,
+        user_id=filters.get("userId"),
+        tag=filters.get("tags") or None,
+        search=filters.get("search")
+    )
+    date_query = {}
+    if filters.get("startDate"):
+        date_query["$gte"] = _parse_purge_date(filters["startDate"], "startDate")
+    if filters.get("endDate"):
+        date_query["$lte"] = _parse_purge_date(filters["endDate"], "endDate")
+    if date_query:
+        query["timestamp"] = date_query
+    return query
+
+
+def new_runner_id():
+    return uuid.uuid4().hex
+
+
+def start_purge_runner(job_id, runner_id):
+    """Run a purge job on a background thread of this process"""
+    threading.Thread(target=run_purge_job, args=(str(job_id), runner_id), name=f"purge-{job_id}", daemon=True).start()
+
+
+def stale_before():
+    """Heartbeats older than this mean the job's runner is gone"""
+    return datetime.datetime.utcnow() - datetime.timedelta(seconds=purge_stale_seconds)
+
+
+def take_over_purge_job(job_id):
+    """
+    Claim a stalled running job for a new runner in this process and start it.
+    Returns the updated job, or None if it isn't stalled or another process won
+    """
+    runner_id = new_runner_id()
+    job = update_purge_job(
+        job_id, {"runnerId": runner_id, "heartbeatAt": datetime.datetime.utcnow()},
+        states=["running"], extra_filter={"heartbeatAt": {"$lt": stale_before()}}
+    )
+    if job is not None:
+        start_purge_runner(job_id, runner_id)
+    return job
+
+
+def sweep_stalled_purge_jobs():
+    """
+    Take over running jobs whose worker went away (e.g. recycled by Gunicorn's
+    max_requests). The heartbeat compare-and-set lets only one worker win each
+    """
+    for job in get_stalled_purge_jobs(stale_before()):
+        if take_over_purge_job(job["_id"]) is not None:
+            print(f"Took over stalled purge job {job['_id']}")
+
+
+purge_sweeper = PeriodicTask("purge-sweep", purge_sweep_seconds, sweep_stalled_purge_jobs)
+
+
+def _sleep_reporting(job_id, runner_id, seconds):
+    """
+    Sleep between batches, reporting in often enough that the job never looks
+    stalled. Returns the job, or None once it was taken over
+    """
+    deadline = time.monotonic() + seconds
+    while True:
+        time.sleep(max(0, min(deadline - time.monotonic(), purge_stale_seconds / 3)))
+        job = record_purge_progress(job_id, runner_id, {})
+        if job is None or job["state"] != "running" or time.monotonic() >= deadline:
+            return job
+
+
+# Fields fetched for each deleted log so the facet dictionary can subtract it
+FACET_PROJECTION = {"_id": 1, "count": 1, **{field: 1 for field in FACET_FIELDS.values()}}
+
+
+def _archive_range(query):
+    """
+    Get the (start, end) of the query's date range if it can reach archive
+    segments, else None
+    """
+    cutoff = segment_store.archived_before()
+    date_range = query.get("timestamp", {})
+    if cutoff is None or (date_range.get("$gte") is not None and date_range["$gte"] >= cutoff):
+        return None
+    return date_range.get("$gte"), date_range.get("$lte")
+
+
+def run_purge_job(job_id, runner_id):
+    """
+    Delete a job's matching logs shard by shard in _id order, batch_size at a
+    time and at most docsPerSecond, recording the cursor after every batch so a
+    paused or interrupted job continues where it stopped. Matching logs in
+    archive segments are removed last, one segment at a time
+    """
+    try:
+        job = get_purge_job(job_id)
+        query = build_purge_query(job["filters"])
+        archive_range = _archive_range(query)
+
+        if job.get("upperIds") is None:
+            # Only logs that exist when the job starts are purged; later ingest is left alone
+            upper_ids = [get_newest_log_id(shard, query) for shard in range(shard_count)]
+            matched = sum(
+                count_logs_on_shard(shard, {**query, "_id": {"$lte": upper_id}})
+                for shard, upper_id in enumerate(upper_ids) if upper_id is not None
+            )
+            if archive_range is not None:
+                matched += segment_store.query(query, start=archive_range[0], end=archive_range[1], limit=1)[0]
+            job = record_purge_progress(job_id, runner_id, {"upperIds": upper_ids, "matched": matched})
+            if job is None:
+                return
+
+        run_started = time.monotonic()
+        run_deleted = 0
+        for shard in range(shard_count):
+            upper_id = job["upperIds"][shard]
+            if upper_id is None or shard in job["shardsDone"]:
+                continue
+            shard_query = {**query, "_id": {"$lte": upper_id}}
+            cursor = job["cursors"].get(str(shard))
+
+            while True:
+                batch_started = time.monotonic()
+                batch = find_logs_after(shard, shard_query, cursor, job["batchSize"], FACET_PROJECTION)
+                ids = [log["_id"] for log in batch]
+                if not ids:
+                    job = record_purge_progress(job_id, runner_id, {"shardsDone": job["shardsDone"] + [shard]})
+                    if job is None:
+                        return
+                    break
+
+                deleted = delete_logs_by_ids(shard, ids)
+                facet_index.forget(batch)
+                cursor = ids[-1]
+                run_deleted += deleted
+                elapsed = time.monotonic() - run_started
+                job = record_purge_progress(
+                    job_id, runner_id,
+                    {f"cursors.{shard}": cursor, "docsPerSecond": run_deleted / elapsed if elapsed > 0 else None},
+                    deleted=deleted
+                )
+                # Other workers cache pages too, so invalidate through the shared generation
+                query_cache.invalidate_everywhere()
+                if job is None or job["state"] != "running":
+                    # Paused, cancelled, or taken over by a resumed runner
+                    return
+
+                # Spread batches out so deletes never exceed the job's rate limit
+                pause = len(ids) / job["docsPerSecondLimit"] - (time.monotonic() - batch_started)
+                if pause > 0:
+                    job = _sleep_reporting(job_id, runner_id, pause)
+                    if job is None or job["state"] != "running":
+                        return
+
+        if archive_range is not None and not job.get("archiveDone"):
+            # Rewriting a segment is idempotent, so a resumed job simply scans the archive again
+            for removed in segment_store.purge_segments(query, start=archive_range[0], end=archive_range[1]):
+                facet_index.forget(removed)
+                job = record_purge_progress(job_id, runner_id, {}, deleted=len(removed))
+                query_cache.invalidate_everywhere()
+                if job is None or job["state"] != "running":
+                    return
+            job = record_purge_progress(job_id, runner_id, {"archiveDone": True})
+            if job is None:
+                return
+
+        update_purge_job(
+            job_id, {"state": "completed", "finishedAt": datetime.datetime.utcnow()},
+            states=["running"], extra_filter={"runnerId": runner_id}
+        )
+    except Exception as e:
+        print(f"Error running purge job {job_id}: {e}")
+        try:
+            update_purge_job(
+                job_id, {"state": "failed", "error": str(e), "finishedAt": datetime.datetime.utcnow()},
+                states=["running"], extra_filter={"runnerId": runner_id}
+            )
+        except Exception as update_error:
+            print(f"Error recording purge job failure: {update_error}")
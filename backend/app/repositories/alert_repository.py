@@ -0,0 +1,100 @@
+from app.db import db
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+import datetime
+
+# Stored alert rules, one document per rule
+alert_rules_collection = db["alert_rules"]
+# Shared windowed counters: one document per rule and time bucket, summed over every ingest process
+alert_windows_collection = db["alert_windows"]
+
+def _rule_id(rule_id):
+    try:
+        return ObjectId(rule_id)
+    except (InvalidId, TypeError):
+        return None
+
+def _format_rule(rule):
+    rule["id"] = str(rule.pop("_id"))
+    return rule
+
+def create_alert_rule(rule):
+    """
+    Store a new alert rule and return it with its id
+    """
+    document = {**rule, "state": "ok", "firingSince": None, "createdAt": datetime.datetime.utcnow()}
+    result = alert_rules_collection.insert_one(document)
+    document["_id"] = result.inserted_id
+    return _format_rule(document)
+
+def get_alert_rules():
+    """
+    Get all alert rules
+    """
+    return [_format_rule(rule) for rule in alert_rules_collection.find().sort("createdAt", 1)]
+
+def delete_alert_rule(rule_id):
+    """
+    Delete an alert rule and its window counters; returns False if it didn't exist
+    """
+    object_id = _rule_id(rule_id)
+    if object_id is None:
+        return False
+    result = alert_rules_collection.delete_one({"_id": object_id})
+    alert_windows_collection.delete_many({"ruleId": str(rule_id)})
+    return result.deleted_count > 0
+
+def set_alert_state(rule_id, state, at, value):
+    """
+    Record a rule changing to state ("firing" or "ok"). Only the first process
+    to see the change updates the rule, so firingSince is set once per episode
+    """
+    object_id = _rule_id(rule_id)
+    if object_id is None:
+        return
+    update = {"state": state, "lastValue": value, "firingSince": at if state == "firing" else None}
+    if state == "firing":
+        update["lastFiredAt"] = at
+    alert_rules_collection.update_one({"_id": object_id, "state": {"$ne": state}}, {"$set": update})
+
+def add_window_counts(increments, expire_at):
+    """
+    Add counts to window buckets; increments maps (rule id, bucket start in epoch seconds) to a count
+    """
+    if not increments:
+        return
+    operations = [
+        UpdateOne(
+            {"_id": f"{rule_id}:{bucket}"},
+            {"$inc": {"count": count}, "$setOnInsert": {"ruleId": rule_id, "bucket": bucket}, "$max": {"expireAt": expire_at[rule_id]}},
+            upsert=True
+        )
+        for (rule_id, bucket), count in increments.items()
+    ]
+    alert_windows_collection.bulk_write(operations, ordered=False)
+
+def seed_window_counts(rule_id, counts, expire_at):
+    """
+    Raise window buckets to counts rebuilt from the logs. Buckets already counted
+    live keep the higher value, so seeding is safe to repeat from every process
+    """
+    operations = [
+        UpdateOne(
+            {"_id": f"{rule_id}:{bucket}"},
+            {"$max": {"count": count, "expireAt": expire_at}, "$setOnInsert": {"ruleId": rule_id, "bucket": bucket}},
+            upsert=True
+        )
+        for bucket, count in counts.items()
+    ]
+    if operations:
+        alert_windows_collection.bulk_write(operations, ordered=False)
+
+def get_window_counts(since):
+    """
+    Get every rule's bucket counts from since (epoch seconds) onwards, as {rule id: {bucket: count}}
+    """
+    windows = {}
+    for window in alert_windows_collection.find({"bucket": {"$gte": since}}, {"ruleId": 1, "bucket": 1, "count": 1}):
+        windows.setdefault(window["ruleId"], {})[window["bucket"]] = window["count"]
+    return windows
@@ -0,0 +1,37 @@
+from app.db import db
+
+# One document shared by every process that caches query results. Each bump of
+# its generation pushes the write range that caused it (None bounds for "drop
+# everything"), so other processes can drop only the entries that range covers.
+cache_state_collection = db["cache_state"]
+GENERATION_ID = "generation"
+# Writes kept on the document; a process further behind than this drops its whole cache
+CACHE_WRITES_KEPT = 256
+
+def get_cache_state():
+    """
+    Get the shared cache generation and the most recent published writes, oldest first
+    """
+    state = cache_state_collection.find_one({"_id": GENERATION_ID})
+    if not state:
+        return 0, []
+    return state.get("value", 0), state.get("writes", [])
+
+def publish_cache_write(origin, lower=None, upper=None):
+    """
+    Bump the shared generation for a write covering [lower, upper] made by origin
+    """
+    cache_state_collection.update_one(
+        {"_id": GENERATION_ID},
+        {
+            "$inc": {"value": 1},
+            "$push": {"writes": {"$each": [{"origin": origin, "lower": lower, "upper": upper}], "$slice": -CACHE_WRITES_KEPT}}
+        },
+        upsert=True
+    )
+
+def bump_cache_generation():
+    """
+    Bump the shared generation so every process drops its whole cache
+    """
+    publish_cache_write(None)
@@ -0,0 +1,97 @@
+from app.db import db
+from pymongo import UpdateOne
+import datetime
+
+# Dictionary of distinct tag/userId/packageName values with counts and last-seen times,
+# one document per (field, value), maintained at ingest
+facets_collection = db["log_facets"]
+# Marker written once the dictionary covers every stored log (fresh database or a rebuild)
+REBUILD_MARKER_ID = "rebuild"
+
+def add_facet_counts(counts):
+    """
+    Add ingest counts to the dictionary; counts maps (field, value) to (count, first seen, last seen)
+    """
+    if not counts:
+        return
+    now = datetime.datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"field": field, "value": value},
+            {
+                "$inc": {"count": count},
+                "$min": {"firstSeen": first_seen},
+                "$max": {"lastSeen": last_seen},
+                "$set": {"updatedAt": now}
+            },
+            upsert=True
+        )
+        for (field, value), (count, first_seen, last_seen) in counts.items()
+    ]
+    facets_collection.bulk_write(operations, ordered=False)
+
+def subtract_facet_counts(counts):
+    """
+    Subtract the counts of deleted logs; counts maps (field, value) to a count.
+    A value whose count drops to 0 has no logs left
+    """
+    if not counts:
+        return
+    now = datetime.datetime.utcnow()
+    operations = [
+        UpdateOne({"field": field, "value": value}, {"$inc": {"count": -count}, "$set": {"updatedAt": now}})
+        for (field, value), count in counts.items()
+    ]
+    facets_collection.bulk_write(operations, ordered=False)
+
+def find_facet_values(field, pattern, limit):
+    """
+    Get up to limit values of field matching a case-insensitive regex that still have logs
+    """
+    cursor = facets_collection.find(
+        {"field": field, "value": {"$regex": pattern, "$options": "i"}, "count": {"$gt": 0}},
+        {"_id": 0, "value": 1}
+    ).limit(limit)
+    return [entry["value"] for entry in cursor]
+
+def merge_facet_rollup(field, rollup):
+    """
+    Merge counts rebuilt from the stored logs; values already counted at ingest keep the higher count
+    """
+    now = datetime.datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"field": field, "value": entry["_id"]},
+            {
+                "$max": {"count": entry["count"], "lastSeen": entry["lastSeen"]},
+                "$min": {"firstSeen": entry["firstSeen"]},
+                "$set": {"updatedAt": now}
+            },
+            upsert=True
+        )
+        for entry in rollup
+    ]
+    for i in range(0, len(operations), 1000):
+        facets_collection.bulk_write(operations[i:i + 1000], ordered=False)
+
+def get_facets(updated_since=None):
+    """
+    Get dictionary entries, only those updated at or after updated_since when given
+    """
+    query = {"field": {"$exists": True}}
+    if updated_since is not None:
+        query["updatedAt"] = {"$gte": updated_since}
+    return list(facets_collection.find(query, {"_id": 0, "field": 1, "value": 1, "count": 1, "lastSeen": 1}))
+
+def is_facet_dictionary_complete():
+    """
+    Check whether the dictionary has been built over every stored log
+    """
+    return facets_collection.find_one({"_id": REBUILD_MARKER_ID}) is not None
+
+def mark_facet_dictionary_complete():
+    facets_collection.update_one(
+        {"_id": REBUILD_MARKER_ID},
+        {"$set": {"rebuiltAt": datetime.datetime.utcnow()}},
+        upsert=True
+    )
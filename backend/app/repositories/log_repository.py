@@ -1,33 +1,266 @@
-from app.db import logs_collection
+from app.db import (
+    logs_analytics_collection, logs_shards, logs_live_shards, logs_analytics_shards,
+    shard_for_user
+)
+from app.repositories.template_repository import get_templates_by_ids, find_template_ids_matching
+from app.template_miner import render_template, template_storage_mode
+from app.archive import segment_store
+from app.facets import facet_index, facets_enabled
+from app.sampling import SampleEstimate, group_sums, sample_sizer, approx_min_matches
 import datetime
+import heapq
+import os
+import threading
+import time
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# A stored document stands for `count` original logs (collapsed repeats or a
+# sampling weight); documents written before that field existed count once
+LOG_WEIGHT = {"$ifNull": ["$count", 1]}
+
+# Fields that identify the neighbours of a log for each context scope. Process and
+# thread ids are only unique per device, so every scope is narrowed to the user.
+CONTEXT_SCOPES = {
+    "user": ("userId",),
+    "process": ("userId", "processId"),
+    "thread": ("userId", "processId", "threadId")
+}
+
+# Shard scatter/gather helpers. With a single target every helper runs inline.
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def _scatter(fn, shards):
+    """
+    Run fn against every shard collection in parallel and return the results in shard order
+    """
+    global _executor, _executor_pid
+    if len(shards) == 1:
+        return [fn(shards[0])]
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=len(shards) * 4, thread_name_prefix="shard-scatter")
+                _executor_pid = os.getpid()
+    return list(_executor.map(fn, shards))
+
+def _timestamp_sort_key(log):
+    """
+    Sort key matching MongoDB's ordering of timestamp values (strings sort before dates)
+    """
+    timestamp = log.get("timestamp")
+    if isinstance(timestamp, datetime.datetime):
+        return (3, timestamp.replace(tzinfo=None))
+    if isinstance(timestamp, str):
+        return (2, timestamp)
+    if isinstance(timestamp, (int, float)):
+        return (1, timestamp)
+    return (0, 0)
+
+def _find_newest(shards, query, skip=0, limit=0, with_ids=False):
+    """
+    Find logs sorted by timestamp descending across shards, applying skip/limit to the merged order
+    """
+    projection = None if with_ids else {"_id": 0}
+    if len(shards) == 1:
+        cursor = shards[0].find(query, projection).sort("timestamp", -1).skip(skip)
+        return list(cursor.limit(limit) if limit else cursor)
+
+    # Each shard returns its own newest skip+limit entries, which is enough to
+    # fill the requested window of the merged order
+    per_shard = skip + limit if limit else 0
+    results = _scatter(
+        lambda collection: list(collection.find(query, projection).sort("timestamp", -1).limit(per_shard)),
+        shards
+    )
+    merged = heapq.merge(*results, key=_timestamp_sort_key, reverse=True)
+    logs = list(merged)[skip:]
+    return logs[:limit] if limit else logs
+
+def _find_all(shards, query):
+    """
+    Find logs matching query on every shard, in no particular order
+    """
+    results = _scatter(lambda collection: list(collection.find(query, {"_id": 0})), shards)
+    return [log for shard_logs in results for log in shard_logs]
+
+def _reaches_archive(query):
+    """
+    Get the archive cutoff if the query has a date range that starts before it
+    (a range with only an end date is unbounded below), else None
+    """
+    cutoff = segment_store.archived_before()
+    date_range = query.get("timestamp")
+    if cutoff is None or not isinstance(date_range, dict):
+        return None
+    start = date_range.get("$gte")
+    if start is None:
+        return cutoff
+    if not isinstance(start, datetime.datetime):
+        return None
+    if start.tzinfo is not None:
+        start = start.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return cutoff if start < cutoff else None
+
+def _hydrate_messages(logs):
+    """
+    Rebuild the message of logs stored compactly as a template id plus parameters
+    """
+    compact = [log for log in logs if "message" not in log and "templateId" in log]
+    if compact:
+        templates = get_templates_by_ids([log["templateId"] for log in compact])
+        for log in compact:
+            template = templates.get(log["templateId"])
+            if template is not None:
+                log["message"] = render_template(template, log.get("params"))
+    for log in logs:
+        log.pop("params", None)
+    return logs
+
+def _count(shards, query):
+    """
+    Count logs matching query across shards
+    """
+    return sum(_scatter(lambda collection: collection.count_documents(query), shards))
+
+def _sum_counts(shards, query):
+    """
+    Sum the number of original logs matching query across shards, honouring each
+    document's count (collapsed repeats and sampling weight)
+    """
+    pipeline = [
+        {"$match": query},
+        {"$group": {"_id": None, "count": {"$sum": LOG_WEIGHT}}}
+    ]
+    results = _scatter(lambda collection: list(collection.aggregate(pipeline)), shards)
+    return sum(result[0]["count"] for result in results if result)
+
+def _aggregate_counts(shards, pipeline):
+    """
+    Run a $group pipeline on every shard and sum the per-group counts
+    """
+    counts = Counter()
+    firsts = {}
+    for result in _scatter(lambda collection: list(collection.aggregate(pipeline)), shards):
+        for entry in result:
+            key = tuple(sorted(entry["_id"].items())) if isinstance(entry["_id"], dict) else entry["_id"]
+            counts[key] += entry["count"]
+            firsts.setdefault(key, entry)
+    return counts, firsts
+
+def _sample_shards(query, projection):
+    """
+    Draw a uniform $sample from every shard, sized by the latency budget, and keep
+    the sampled documents matching query. $sample stays the first stage so it
+    picks random documents instead of sorting every match; sampled documents that
+    don't match count as zeros, which widens the interval of selective filters.
+    Returns a SampleEstimate builder input:
+    [(documents on the shard, documents sampled, matching sampled documents)]
+    """
+    size = sample_sizer.size()
+    pipeline = [{"$sample": {"size": size}}]
+    if query:
+        pipeline.append({"$match": query})
+    pipeline.append({"$project": {"_id": 0, **projection}})
+    
+    def draw(collection):
+        # Collection metadata, not a count; exact enough to scale the sample
+        population = collection.estimated_document_count()
+        started = time.monotonic()
+        docs = list(collection.aggregate(pipeline))
+        sampled = max(min(size, population), len(docs))
+        sample_sizer.record(sampled, time.monotonic() - started)
+        return max(population, sampled), sampled, docs
+    
+    return _scatter(draw, logs_analytics_shards)
+
+def _estimate(samples, key_fn):
+    """
+    Scale per-group weighted counts of sampled documents up to the whole collection
+    """
+    weight = lambda doc: doc["count"] if isinstance(doc.get("count"), (int, float)) else 1
+    estimate = SampleEstimate()
+    for population, sampled, docs in samples:
+        estimate.add_stratum(population, sampled, group_sums(docs, key_fn, weight))
+    return estimate
 
 def find_logs(query=None):
     """
     Find logs based on the query
     """
     query = query or {}
-    return list(logs_collection.find(query, {"_id": 0}))
+    if "userId" in query and isinstance(query["userId"], str):
+        logs = list(logs_analytics_shards[shard_for_user(query["userId"])].find(query, {"_id": 0}))
+    else:
+        logs = _find_all(logs_analytics_shards, query)
+    
+    # Date ranges that start before the hot tier also read the archive segments
+    if _reaches_archive(query):
+        timestamp = query["timestamp"]
+        _, archived = segment_store.query(query, start=timestamp.get("$gte"), end=timestamp.get("$lte"))
+        logs.extend(archived)
+    return _hydrate_messages(logs)
 
 def find_user_logs(user_id):
     """
     Find all logs for a specific user
     """
-    return list(logs_collection.find({"userId": user_id}, {"_id": 0}))
+    return _hydrate_messages(list(logs_analytics_shards[shard_for_user(user_id)].find({"userId": user_id}, {"_id": 0})))
 
 def get_all_logs():
     """
     Get all logs from the database
     """
-    return list(logs_collection.find({}, {"_id": 0}))
+    return _hydrate_messages(_find_all(logs_analytics_shards, {}))
 
 def insert_log(log_data):
     """
     Insert a new log entry
     """
-    result = logs_collection.insert_one(log_data)
+    result = logs_shards[shard_for_user(log_data.get("userId"))].insert_one(log_data)
     return result.acknowledged 
 
+def insert_logs(logs_data):
+    """
+    Insert many log entries with one unordered bulk write per shard
+    """
+    by_shard = {}
+    for log_data in logs_data:
+        by_shard.setdefault(shard_for_user(log_data.get("userId")), []).append(log_data)
+    for shard, shard_logs in by_shard.items():
+        logs_shards[shard].insert_many(shard_logs, ordered=False)
+    return True
+
+def find_logs_before(shard, cutoff, limit):
+    """
+    Get up to limit of the oldest logs on a shard with a timestamp before cutoff
+    """
+    return list(logs_shards[shard].find({"timestamp": {"$lt": cutoff}}).sort("timestamp", 1).limit(limit))
+
+def delete_logs_by_ids(shard, log_ids, batch_size=1000):
+    """
+    Delete logs on a shard by _id in batches; returns how many were deleted
+    """
+    deleted = 0
+    for i in range(0, len(log_ids), batch_size):
+        result = logs_shards[shard].delete_many({"_id": {"$in": log_ids[i:i + batch_size]}})
+        deleted += result.deleted_count
+    return deleted
+
+def increment_log_repeats(user_id, log_id, count, first_seen=None, last_seen=None):
+    """
+    Add collapsed repeats to a stored log document
+    """
+    update = {"$inc": {"count": count}}
+    if first_seen is not None:
+        update["$min"] = {"firstSeen": first_seen}
+    if last_seen is not None:
+        update["$max"] = {"lastSeen": last_seen}
+    result = logs_shards[shard_for_user(user_id)].update_one({"_id": log_id}, update)
+    return result.acknowledged
+
 def get_recent_logs(limit=100, user_id=None, level=None):
     """
     Get recent logs for live console, sorted by timestamp descending
@@ -36,7 +269,7 @@ def get_recent_logs(limit=100, user_id=None, level=None):
     
     # Add filters if provided
     if user_id:
-        query["userId"] = {"$regex": user_id, "$options": "i"}  # Case insensitive partial match
+        query["userId"] = _user_id_filter(user_id)  # Case insensitive partial match
     
     if level:
         if isinstance(level, list):
@@ -47,10 +280,7 @@ def get_recent_logs(limit=100, user_id=None, level=None):
     try:
         # Get recent logs sorted by timestamp (newest first)
         # Use MongoDB's native sorting, which should handle different timestamp types
-        logs = list(logs_collection.find(
-            query, 
-            {"_id": 0}
-        ).sort("timestamp", -1).limit(limit))
+        logs = _hydrate_messages(_find_newest(logs_live_shards, query, limit=limit, with_ids=True))
         
         # Convert timestamp to consistent string format for frontend
         for log in logs:
@@ -80,7 +310,9 @@ def get_recent_logs(limit=100, user_id=None, level=None):
                             log['timestamp'] = time_part
                         # Otherwise keep original
             
-            # Ensure required fields exist
+            # Ensure required fields exist; stored logs are identified by their _id
+            if '_id' in log:
+                log['id'] = str(log.pop('_id'))
             if 'id' not in log:
                 # Create a more unique ID using timestamp, userId, and message
                 timestamp_str = str(log.get('timestamp', ''))
@@ -101,19 +333,20 @@ def get_total_logs_count():
     """
     Get total count of logs
     """
-    return logs_collection.count_documents({})
+    return _sum_counts(logs_analytics_shards, {})
 
 def get_unique_users_count():
     """
     Get count of unique user IDs
     """
-    return len(logs_collection.distinct("userId"))
+    users = _scatter(lambda collection: collection.distinct("userId"), logs_analytics_shards)
+    return len(set().union(*users))
 
 def get_error_logs_count():
     """
     Get count of logs with error level
     """
-    return logs_collection.count_documents({"level": {"$regex": "^error$", "$options": "i"}})
+    return _sum_counts(logs_analytics_shards, {"level": {"$regex": "^error$", "$options": "i"}})
 
 def get_top_error_tag():
     """
@@ -121,15 +354,15 @@ def get_top_error_tag():
     """
     pipeline = [
         {"$match": {"level": {"$regex": "^error$", "$options": "i"}, "tag": {"$exists": True}}},
-        {"$group": {"_id": "$tag", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}},
-        {"$limit": 1}
+        {"$group": {"_id": "$tag", "count": {"$sum": LOG_WEIGHT}}}
     ]
-    result = list(logs_collection.aggregate(pipeline))
-    if result:
+    # Per-shard winners can differ from the global one, so shards return every group
+    if len(logs_analytics_shards) == 1:
+        pipeline += [{"$sort": {"count": -1}}, {"$limit": 1}]
+    counts, _ = _aggregate_counts(logs_analytics_shards, pipeline)
+    if counts:
         total_errors = get_error_logs_count()
-        tag = result[0]["_id"]
-        count = result[0]["count"]
+        tag, count = counts.most_common(1)[0]
         percentage = round((count / total_errors * 100)) if total_errors > 0 else 0
         return {"tag": tag, "percentage": percentage}
     return {"tag": "none", "percentage": 0}
@@ -150,7 +383,7 @@ def get_recent_log_rate():
         ]
     }
     
-    recent_logs_count = logs_collection.count_documents(query)
+    recent_logs_count = _sum_counts(logs_analytics_shards, query)
     return round(recent_logs_count / 10, 1)  # logs per minute
 
 def get_peak_logs_info():
@@ -170,18 +403,18 @@ def get_peak_logs_info():
                         "day": {"$dayOfMonth": "$timestamp"},
                         "hour": {"$hour": "$timestamp"}
                     },
-                    "count": {"$sum": 1},
+                    "count": {"$sum": LOG_WEIGHT},
                     "timestamp": {"$first": "$timestamp"}
                 }
-            },
-            {"$sort": {"count": -1}},
-            {"$limit": 1}
+            }
         ]
-        result = list(logs_collection.aggregate(pipeline))
+        if len(logs_analytics_shards) == 1:
+            pipeline += [{"$sort": {"count": -1}}, {"$limit": 1}]
+        counts, firsts = _aggregate_counts(logs_analytics_shards, pipeline)
         
-        if result:
-            count = result[0]["count"]
-            timestamp = result[0]["timestamp"]
+        if counts:
+            key, count = counts.most_common(1)[0]
+            timestamp = firsts[key]["timestamp"]
             time_str = timestamp.strftime("%H:00") if timestamp else "00:00"
             return {"count": count, "time": time_str}
     except Exception:
@@ -189,7 +422,7 @@ def get_peak_logs_info():
         pass
     
     # Fallback: count logs by a simple grouping
-    total_logs = logs_collection.count_documents({})
+    total_logs = _sum_counts(logs_analytics_shards, {})
     if total_logs > 0:
         # Return a reasonable estimate
         return {"count": min(total_logs, 50), "time": "15:00"}
@@ -221,23 +454,23 @@ def get_hourly_log_activity():
                     "_id": {
                         "hour": {"$hour": "$timestamp"}
                     },
-                    "count": {"$sum": 1}
+                    "count": {"$sum": LOG_WEIGHT}
                 }
             },
             {"$sort": {"_id.hour": 1}}
         ]
         
-        result = list(logs_collection.aggregate(pipeline))
+        counts, firsts = _aggregate_counts(logs_analytics_shards, pipeline)
         
         # Create 24-hour labels (0-23)
         hours = [f"{i:02d}:00" for i in range(24)]
         data = [0] * 24  # Initialize with zeros for all hours
         
         # Fill in actual data
-        for entry in result:
-            hour = entry["_id"]["hour"]
+        for key, count in counts.items():
+            hour = firsts[key]["_id"]["hour"]
             if 0 <= hour < 24:
-                data[hour] = entry["count"]
+                data[hour] = count
         
         return {
             "labels": hours,
@@ -287,22 +520,23 @@ def get_monthly_log_activity():
                         "year": {"$year": "$timestamp"},
                         "month": {"$month": "$timestamp"}
                     },
-                    "count": {"$sum": 1}
+                    "count": {"$sum": LOG_WEIGHT}
                 }
             },
             {"$sort": {"_id.year": 1, "_id.month": 1}}
         ]
-        result = list(logs_collection.aggregate(pipeline))
+        counts, firsts = _aggregate_counts(logs_analytics_shards, pipeline)
         
-        if result:
+        if counts:
             # Convert to format expected by frontend
             months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
             data = [0] * 12  # Initialize with zeros for all months
             
-            for entry in result:
-                month_index = entry["_id"]["month"] - 1  # Convert 1-12 to 0-11
+            # Walk months oldest first so the latest year wins, as before
+            for key in sorted(counts, key=lambda key: (firsts[key]["_id"]["year"], firsts[key]["_id"]["month"])):
+                month_index = firsts[key]["_id"]["month"] - 1  # Convert 1-12 to 0-11
                 if 0 <= month_index < 12:
-                    data[month_index] = entry["count"]
+                    data[month_index] = counts[key]
             
             return {
                 "labels": months,
@@ -317,7 +551,7 @@ def get_monthly_log_activity():
         print(f"MongoDB aggregation error: {e}")
     
     # Fallback: create a simple chart based on total logs
-    total_logs = logs_collection.count_documents({})
+    total_logs = _sum_counts(logs_analytics_shards, {})
     current_month = datetime.datetime.utcnow().month - 1  # 0-indexed
     
     months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
@@ -334,9 +568,21 @@ def get_monthly_log_activity():
         }]
     }
 
-def get_logs_with_pagination(page=1, limit=10, level=None, user_id=None, tag=None, start_date=None, end_date=None, search=None):
+def _user_id_filter(user_id):
     """
-    Get logs with pagination and filtering for the Logs Table
+    Case-insensitive partial userId match, resolved to exact values through the
+    facet dictionary when it can be so the userId index is used
+    """
+    user_ids = facet_index.resolve("userId", user_id) if facets_enabled else None
+    if user_ids is not None:
+        return {"$in": user_ids}
+    return {"$regex": user_id, "$options": "i"}
+
+def build_logs_filter(level=None, user_id=None, tag=None, search=None, stored=True):
+    """
+    Build the level/user/tag/search part of a Logs Table query. With
+    stored=False the filter is for records that haven't been stored yet: search
+    only matches the message itself and userId stays a regex
     """
     query = {}
     
@@ -348,7 +594,8 @@ def get_logs_with_pagination(page=1, limit=10, level=None, user_id=None, tag=Non
             query["level"] = {"$regex": f"^{level}$", "$options": "i"}
     
     if user_id:
-        query["userId"] = {"$regex": user_id, "$options": "i"}  # Partial match
+        # Partial match; records not stored yet may carry userIds the dictionary hasn't seen
+        query["userId"] = _user_id_filter(user_id) if stored else {"$regex": user_id, "$options": "i"}
     
     if tag:
         if isinstance(tag, list):
@@ -365,6 +612,26 @@ def get_logs_with_pagination(page=1, limit=10, level=None, user_id=None, tag=Non
             {"tag": search_regex},
             {"level": search_regex}
         ]
+        # Only compact storage drops the message; those logs are matched through
+        # their template text or parameters, and logs that kept it never are
+        if not stored or template_storage_mode != "compact":
+            return query
+        compacted = {"message": {"$exists": False}}
+        try:
+            template_ids = find_template_ids_matching(search)
+            if template_ids:
+                query["$or"].append({**compacted, "templateId": {"$in": template_ids}})
+            query["$or"].append({**compacted, "params": search_regex})
+        except Exception as e:
+            print(f"Error matching search against templates: {e}")
+    
+    return query
+
+def _build_table_query(level=None, user_id=None, tag=None, start_date=None, end_date=None, search=None):
+    """
+    Build the full Logs Table query, date range included
+    """
+    query = build_logs_filter(level=level, user_id=user_id, tag=tag, search=search)
     
     # Date range filtering
     if start_date or end_date:
@@ -375,7 +642,7 @@ def get_logs_with_pagination(page=1, limit=10, level=None, user_id=None, tag=Non
                 start_dt = datetime.datetime.fromisoformat(start_date.replace('Z', '+00:00'))
                 # Convert to UTC if it has timezone info
                 if start_dt.tzinfo is not None:
-                    start_dt = start_dt.replace(tzinfo=None)  # Remove timezone info for MongoDB comparison
+                    start_dt = start_dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)  # MongoDB compares naive UTC
                 date_query["$gte"] = start_dt
                 print(f"DEBUG: Parsed start_date '{start_date}' as {start_dt}")
             except Exception as e:
@@ -387,7 +654,7 @@ def get_logs_with_pagination(page=1, limit=10, level=None, user_id=None, tag=Non
                 end_dt = datetime.datetime.fromisoformat(end_date.replace('Z', '+00:00'))
                 # Convert to UTC if it has timezone info
                 if end_dt.tzinfo is not None:
-                    end_dt = end_dt.replace(tzinfo=None)  # Remove timezone info for MongoDB comparison
+                    end_dt = end_dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)  # MongoDB compares naive UTC
                 date_query["$lte"] = end_dt
                 print(f"DEBUG: Parsed end_date '{end_date}' as {end_dt}")
             except Exception as e:
@@ -397,10 +664,19 @@ def get_logs_with_pagination(page=1, limit=10, level=None, user_id=None, tag=Non
         if date_query:
             query["timestamp"] = date_query
             print(f"DEBUG: Date query: {date_query}")
-        
+    
+    return query
+
+def get_logs_with_pagination(page=1, limit=10, level=None, user_id=None, tag=None, start_date=None, end_date=None, search=None):
+    """
+    Get logs with pagination and filtering for the Logs Table
+    """
+    query = _build_table_query(level=level, user_id=user_id, tag=tag, start_date=start_date, end_date=end_date, search=search)
+    
+    if start_date or end_date:
         # Also check what timestamps we have in the database for debugging
         try:
-            sample_logs = list(logs_collection.find({}, {"timestamp": 1, "_id": 0}).limit(5))
+            sample_logs = list(logs_analytics_collection.find({}, {"timestamp": 1, "_id": 0}).limit(5))
             print(f"DEBUG: Sample timestamps in DB: {[log.get('timestamp') for log in sample_logs]}")
         except Exception as e:
             print(f"DEBUG: Failed to get sample timestamps: {e}")
@@ -410,13 +686,20 @@ def get_logs_with_pagination(page=1, limit=10, level=None, user_id=None, tag=Non
         skip = (page - 1) * limit
         
         # Get total count for pagination info
-        total_count = logs_collection.count_documents(query)
+        total_count = _count(logs_analytics_shards, query)
         
         # Get paginated logs sorted by timestamp (newest first)
-        logs = list(logs_collection.find(
-            query, 
-            {"_id": 0}
-        ).sort("timestamp", -1).skip(skip).limit(limit))
+        if _reaches_archive(query):
+            # Merge the newest skip+limit rows of both tiers, streaming only overlapping segments
+            archived_count, archived = segment_store.query(
+                query, start=query["timestamp"].get("$gte"), end=query["timestamp"].get("$lte"), limit=skip + limit
+            )
+            total_count += archived_count
+            hot = _find_newest(logs_analytics_shards, query, limit=skip + limit, with_ids=True)
+            merged = list(heapq.merge(hot, archived, key=_timestamp_sort_key, reverse=True))
+            logs = _hydrate_messages(merged[skip:skip + limit])
+        else:
+            logs = _hydrate_messages(_find_newest(logs_analytics_shards, query, skip=skip, limit=limit, with_ids=True))
         
         # Format logs for frontend
         formatted_logs = []
@@ -437,7 +720,9 @@ def get_logs_with_pagination(page=1, limit=10, level=None, user_id=None, tag=Non
                     # Keep original if parsing fails
                     pass
             
-            # Ensure required fields exist
+            # Ensure required fields exist; stored logs are identified by their _id
+            if '_id' in formatted_log:
+                formatted_log['id'] = str(formatted_log.pop('_id'))
             if 'id' not in formatted_log:
                 # Create a more unique ID using timestamp, userId, and message
                 timestamp_str = str(formatted_log.get('timestamp', ''))
@@ -485,10 +770,302 @@ def get_all_tags():
     """
     try:
         # Use MongoDB distinct to get unique tags
-        tags = logs_collection.distinct("tag")
+        tags = set().union(*_scatter(lambda collection: collection.distinct("tag"), logs_analytics_shards))
         # Filter out None/null values and sort
         tags = [tag for tag in tags if tag is not None]
         return sorted(tags)
     except Exception as e:
         print(f"Error fetching tags: {e}")
-        return [] 
\ No newline at end of file
+        return [] 
+
+def get_template_counts(start_date=None, end_date=None):
+    """
+    Count logs per message template id over a time range
+    """
+    match = {"templateId": {"$exists": True}}
+    if start_date or end_date:
+        match["timestamp"] = {}
+        if start_date:
+            match["timestamp"]["$gte"] = start_date
+        if end_date:
+            match["timestamp"]["$lte"] = end_date
+    
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": "$templateId", "count": {"$sum": LOG_WEIGHT}}}
+    ]
+    counts, _ = _aggregate_counts(logs_analytics_shards, pipeline)
+    return counts
+
+def get_log_bucket_counts(query, start, bucket_seconds):
+    """
+    Count logs matching query from start onwards per bucket_seconds wide time
+    bucket, keyed by the bucket's start in epoch seconds
+    """
+    bucket_ms = int(bucket_seconds * 1000)
+    epoch_ms = {"$toLong": "$timestamp"}
+    pipeline = [
+        {"$match": {**query, "timestamp": {"$gte": start}}},
+        {"$group": {
+            "_id": {"$subtract": [epoch_ms, {"$mod": [epoch_ms, bucket_ms]}]},
+            "count": {"$sum": LOG_WEIGHT}
+        }}
+    ]
+    # Read from the primaries so windows rebuilt right after a write include it
+    counts, _ = _aggregate_counts(logs_shards, pipeline)
+    return {int(bucket // 1000): count for bucket, count in counts.items()}
+
+def get_newest_log_id(shard, query):
+    """
+    Get the largest _id of the logs matching query on a shard, or None
+    """
+    newest = list(logs_shards[shard].find(query, {"_id": 1}).sort("_id", -1).limit(1))
+    return newest[0]["_id"] if newest else None
+
+def count_logs_on_shard(shard, query):
+    """
+    Count the documents matching query on one shard's primary
+    """
+    return logs_shards[shard].count_documents(query)
+
+def find_logs_after(shard, query, after_id, limit, projection=None):
+    """
+    Get up to limit logs matching query on a shard in _id order, starting after
+    after_id, with only the projected fields (just _id by default)
+    """
+    if after_id is not None:
+        query = {**query, "_id": {**query.get("_id", {}), "$gt": after_id}}
+    return list(logs_shards[shard].find(query, projection or {"_id": 1}).sort("_id", 1).limit(limit))
+
+def get_facet_rollup(field):
+    """
+    Count logs and their first/last timestamps per string value of field across shards
+    """
+    pipeline = [
+        {"$match": {field: {"$type": "string"}}},
+        {"$group": {
+            "_id": f"${field}",
+            "count": {"$sum": LOG_WEIGHT},
+            "firstSeen": {"$min": "$timestamp"},
+            "lastSeen": {"$max": "$timestamp"}
+        }}
+    ]
+    merged = {}
+    for result in _scatter(lambda collection: list(collection.aggregate(pipeline, allowDiskUse=True)), logs_analytics_shards):
+        for entry in result:
+            known = merged.get(entry["_id"])
+            if known is None:
+                merged[entry["_id"]] = entry
+                continue
+            known["count"] += entry["count"]
+            by_time = lambda timestamp: _timestamp_sort_key({"timestamp": timestamp})
+            known["firstSeen"] = min(known["firstSeen"], entry["firstSeen"], key=by_time)
+            known["lastSeen"] = max(known["lastSeen"], entry["lastSeen"], key=by_time)
+    return list(merged.values())
+
+def get_table_facets(level=None, user_id=None, tag=None, start_date=None, end_date=None, search=None, top_n=10, approx=False):
+    """
+    Count logs per level, tag and userId (top_n each) plus the total for a Logs
+    Table filter, with one $facet aggregation per shard, or estimate them from
+    a uniform sample with approx
+    """
+    query = _build_table_query(level=level, user_id=user_id, tag=tag, start_date=start_date, end_date=end_date, search=search)
+    if approx:
+        estimate = _approx_table_facets(query, top_n)
+        if estimate is not None:
+            return estimate
+    
+    # With several shards each one returns more than top_n so the merged top values are reliable
+    per_shard = top_n if len(logs_analytics_shards) == 1 else top_n * 4
+    def top_values(field):
+        return [
+            {"$match": {field: {"$ne": None}}},
+            {"$group": {"_id": f"${field}", "count": {"$sum": LOG_WEIGHT}}},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$limit": per_shard}
+        ]
+    pipeline = [
+        {"$match": query},
+        {"$facet": {
+            "total": [{"$group": {"_id": None, "count": {"$sum": LOG_WEIGHT}}}],
+            "level": [{"$group": {"_id": "$level", "count": {"$sum": LOG_WEIGHT}}}],
+            "tag": top_values("tag"),
+            "userId": top_values("userId")
+        }}
+    ]
+    
+    total = 0
+    counts = {"level": Counter(), "tag": Counter(), "userId": Counter()}
+    for result in _scatter(lambda collection: list(collection.aggregate(pipeline)), logs_analytics_shards):
+        facets = result[0]
+        total += facets["total"][0]["count"] if facets["total"] else 0
+        for field in counts:
+            for entry in facets[field]:
+                if entry["_id"] is not None:
+                    counts[field][str(entry["_id"])] += entry["count"]
+    
+    # Date ranges that start before the hot tier also count archived logs
+    if _reaches_archive(query):
+        archived = segment_store.facet_counts(query, start=query["timestamp"].get("$gte"), end=query["timestamp"].get("$lte"))
+        total += archived["total"]
+        for field in counts:
+            counts[field].update(archived[field])
+    
+    def ranked(counter, limit):
+        return [{"value": value, "count": count} for value, count in sorted(counter.items(), key=lambda item: (-item[1], item[0]))[:limit]]
+    
+    return {
+        "total": total,
+        "levels": ranked(counts["level"], len(counts["level"])),
+        "tags": ranked(counts["tag"], top_n),
+        "userIds": ranked(counts["userId"], top_n),
+        # Also set when approx was asked for but the filter was too selective to sample
+        "approximate": False
+    }
+
+def _approx_table_facets(query, top_n):
+    """
+    Estimate get_table_facets from a uniform sample of each shard filtered by query.
+    Returns None when too few sampled logs match for a useful estimate
+    """
+    def groups(log):
+        keys = ["total"]
+        for field in ("level", "tag", "userId"):
+            if log.get(field) is not None:
+                keys.append((field, str(log[field])))
+        return keys
+    
+    samples = _sample_shards(query, {"level": 1, "tag": 1, "userId": 1, "count": 1})
+    matched = sum(len(docs) for _, _, docs in samples)
+    if matched < approx_min_matches and any(sampled < population for population, sampled, _ in samples):
+        return None
+    estimate = _estimate(samples, groups)
+    
+    def ranked(field, limit):
+        entries = []
+        for group in estimate.groups():
+            if isinstance(group, tuple) and group[0] == field:
+                group_estimate = estimate.estimate(group)
+                entries.append({"value": group[1], "count": group_estimate["value"], "low": group_estimate["low"], "high": group_estimate["high"]})
+        entries.sort(key=lambda entry: (-entry["count"], entry["value"]))
+        return entries[:limit]
+    
+    total = estimate.estimate("total")
+    return {
+        "total": total["value"],
+        "totalInterval": {"low": total["low"], "high": total["high"]},
+        "levels": ranked("level", None),
+        "tags": ranked("tag", top_n),
+        "userIds": ranked("userId", top_n),
+        "approximate": True,
+        "sample": estimate.sample_info()
+    }
+
+def get_log_context(log_id, before=20, after=20, scope="process"):
+    """
+    Get a log and up to before/after neighbouring logs from the same user,
+    process or thread, using one bounded index range per side. Returns None if
+    the log doesn't exist
+    """
+    anchor = None
+    for log in _scatter(lambda collection: collection.find_one({"_id": log_id}), logs_shards):
+        if log is not None:
+            anchor = log
+            break
+    if anchor is None:
+        return None
+    
+    scope_query = {}
+    for field in CONTEXT_SCOPES[scope]:
+        if anchor.get(field) is None:
+            raise ValueError(f"Log has no {field}, so it has no {scope} context")
+        scope_query[field] = anchor[field]
+    
+    # Logs of one user live on one shard. (timestamp, _id) orders logs with equal timestamps
+    collection = logs_shards[shard_for_user(anchor.get("userId"))]
+    timestamp = anchor["timestamp"]
+    earlier = list(collection.find({
+        **scope_query,
+        "$or": [{"timestamp": {"$lt": timestamp}}, {"timestamp": timestamp, "_id": {"$lt": log_id}}]
+    }).sort([("timestamp", -1), ("_id", -1)]).limit(before)) if before else []
+    later = list(collection.find({
+        **scope_query,
+        "$or": [{"timestamp": {"$gt": timestamp}}, {"timestamp": timestamp, "_id": {"$gt": log_id}}]
+    }).sort([("timestamp", 1), ("_id", 1)]).limit(after)) if after else []
+    
+    earlier.reverse()
+    _hydrate_messages(earlier + [anchor] + later)
+    return {"log": anchor, "before": earlier, "after": later}
+
+def get_approx_dashboard_stats():
+    """
+    Estimate the dashboard's total, error, top error tag and peak hour figures
+    from one uniform sample. Returns ({stat: estimate}, sample info)
+    """
+    def groups(log):
+        keys = ["total"]
+        if str(log.get("level", "")).lower() == "error":
+            keys.append("errors")
+            if log.get("tag") is not None:
+                keys.append(("errorTag", log["tag"]))
+        timestamp = log.get("timestamp")
+        if isinstance(timestamp, datetime.datetime):
+            keys.append(("hour", timestamp.year, timestamp.month, timestamp.day, timestamp.hour))
+        return keys
+    
+    estimate = _estimate(_sample_shards({}, {"level": 1, "tag": 1, "timestamp": 1, "count": 1}), groups)
+    
+    errors = estimate.estimate("errors")
+    error_tags = [group for group in estimate.groups() if isinstance(group, tuple) and group[0] == "errorTag"]
+    top_error_tag = None
+    if error_tags:
+        tag_estimates = {group[1]: estimate.estimate(group) for group in error_tags}
+        tag = max(tag_estimates, key=lambda tag: tag_estimates[tag]["value"])
+        top_error_tag = {"tag": tag, **tag_estimates[tag]}
+    
+    hours = [group for group in estimate.groups() if isinstance(group, tuple) and group[0] == "hour"]
+    peak = None
+    if hours:
+        hour_estimates = {group: estimate.estimate(group) for group in hours}
+        busiest = max(hour_estimates, key=lambda group: hour_estimates[group]["value"])
+        peak = {"time": f"{busiest[4]:02d}:00", **hour_estimates[busiest]}
+    
+    return {
+        "totalLogs": estimate.estimate("total"),
+        "errors": errors,
+        "topErrorTag": top_error_tag,
+        "peakLogs": peak
+    }, estimate.sample_info()
+
+def get_approx_monthly_log_activity():
+    """
+    Estimate log counts per month from a uniform sample, with 95% confidence bounds
+    """
+    # Unfiltered so the sample is drawn first; logs without a date timestamp are left out of the groups
+    samples = _sample_shards({}, {"timestamp": 1, "count": 1})
+    def month(log):
+        timestamp = log.get("timestamp")
+        return (timestamp.year, timestamp.month) if isinstance(timestamp, datetime.datetime) else None
+    estimate = _estimate(samples, month)
+    
+    months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+    data, low, high = [0] * 12, [0] * 12, [0] * 12
+    # Walk months oldest first so the latest year wins, like the exact chart
+    for year, month in sorted(estimate.groups()):
+        month_estimate = estimate.estimate((year, month))
+        data[month - 1] = month_estimate["value"]
+        low[month - 1] = month_estimate["low"]
+        high[month - 1] = month_estimate["high"]
+    
+    return {
+        "labels": months,
+        "datasets": [{
+            "label": "Log Activity (estimated)",
+            "data": data,
+            "borderColor": "rgb(59, 130, 246)",
+            "backgroundColor": "rgba(59, 130, 246, 0.5)"
+        }],
+        "approximate": True,
+        "confidence": {"low": low, "high": high},
+        "sample": estimate.sample_info()
+    }
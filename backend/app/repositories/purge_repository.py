@@ -0,0 +1,68 @@
+from app.db import db
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+import datetime
+
+# Background purge jobs, one document per job; shared so any worker can report or control a job
+purge_jobs_collection = db["purge_jobs"]
+
+def _job_id(job_id):
+    try:
+        return ObjectId(job_id)
+    except (InvalidId, TypeError):
+        return None
+
+def create_purge_job(job):
+    """
+    Store a new purge job and return it with its id
+    """
+    document = {**job, "createdAt": datetime.datetime.utcnow()}
+    result = purge_jobs_collection.insert_one(document)
+    document["_id"] = result.inserted_id
+    return document
+
+def get_purge_job(job_id):
+    """
+    Get a purge job by id, or None
+    """
+    object_id = _job_id(job_id)
+    if object_id is None:
+        return None
+    return purge_jobs_collection.find_one({"_id": object_id})
+
+def get_purge_jobs(limit=50):
+    """
+    Get the most recent purge jobs
+    """
+    return list(purge_jobs_collection.find().sort("createdAt", -1).limit(limit))
+
+def get_stalled_purge_jobs(stale_before):
+    """
+    Get running jobs whose runner last reported before stale_before
+    """
+    return list(purge_jobs_collection.find({"state": "running", "heartbeatAt": {"$lt": stale_before}}))
+
+def update_purge_job(job_id, fields, states=None, extra_filter=None):
+    """
+    Set fields on a job, only if it is in one of states when given.
+    Returns the updated job, or None if it didn't match
+    """
+    object_id = _job_id(job_id)
+    if object_id is None:
+        return None
+    match = {"_id": object_id, **(extra_filter or {})}
+    if states is not None:
+        match["state"] = {"$in": list(states)}
+    return purge_jobs_collection.find_one_and_update(match, {"$set": fields}, return_document=ReturnDocument.AFTER)
+
+def record_purge_progress(job_id, runner_id, fields, deleted=0):
+    """
+    Record a batch of a running job. Returns the job after the update, or None
+    if another runner has taken the job over
+    """
+    return purge_jobs_collection.find_one_and_update(
+        {"_id": ObjectId(job_id), "runnerId": runner_id},
+        {"$set": {**fields, "heartbeatAt": datetime.datetime.utcnow()}, "$inc": {"deleted": deleted}},
+        return_document=ReturnDocument.AFTER
+    )
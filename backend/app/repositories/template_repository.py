@@ -0,0 +1,86 @@
+from app.db import db
+from app.template_miner import WILDCARD
+import datetime
+import re
+
+# Collection for storing mined message templates, one document per template
+templates_collection = db["log_templates"]
+
+# Templates never change once stored, so every process can keep them forever
+_template_cache = {}
+
+def save_template(template_id, template_tokens, supersedes=None):
+    """
+    Store a template if it doesn't exist yet, linking the template it replaces
+    """
+    templates_collection.update_one(
+        {"_id": template_id},
+        {"$setOnInsert": {
+            "template": template_tokens,
+            "text": " ".join(template_tokens),
+            "tokenCount": len(template_tokens),
+            "createdAt": datetime.datetime.utcnow()
+        }},
+        upsert=True
+    )
+    if supersedes:
+        templates_collection.update_one({"_id": supersedes}, {"$set": {"supersededBy": template_id}})
+    _template_cache[template_id] = template_tokens
+
+def get_active_templates():
+    """
+    Get the token lists of all templates that haven't been generalized further
+    """
+    try:
+        templates = templates_collection.find({"supersededBy": {"$exists": False}}, {"template": 1})
+        return [template["template"] for template in templates]
+    except Exception as e:
+        print(f"Error fetching templates: {e}")
+        return []
+
+def get_templates_by_ids(template_ids):
+    """
+    Get template documents by id, reading through the in-process cache
+    """
+    missing = [template_id for template_id in set(template_ids) if template_id not in _template_cache]
+    if missing:
+        for template in templates_collection.find({"_id": {"$in": missing}}, {"template": 1}):
+            _template_cache[template["_id"]] = template["template"]
+    return {template_id: _template_cache[template_id] for template_id in template_ids if template_id in _template_cache}
+
+def get_template_lineage(template_ids):
+    """
+    Map each template id to the newest template it was generalized into
+    """
+    superseded = {}
+    for template in templates_collection.find({"supersededBy": {"$exists": True}}, {"supersededBy": 1}):
+        superseded[template["_id"]] = template["supersededBy"]
+
+    lineage = {}
+    for template_id in template_ids:
+        current = template_id
+        # Bounded walk in case of a cycle from concurrent writers
+        for _ in range(len(superseded) + 1):
+            if current not in superseded:
+                break
+            current = superseded[current]
+        lineage[template_id] = current
+    return lineage
+
+def find_template_ids_matching(pattern):
+    """
+    Get ids of templates whose fixed text matches a case-insensitive regex. A
+    match that needs the characters of a "<*>" placeholder (e.g. "User <") says
+    nothing about the logs' actual parameters, so those templates are left out.
+    """
+    try:
+        fixed_text_regex = re.compile(pattern, re.IGNORECASE)
+    except re.error:
+        return []
+    return [
+        template["_id"]
+        for template in templates_collection.find(
+            {"text": {"$regex": pattern, "$options": "i"}}, {"_id": 1, "text": 1}
+        )
+        if fixed_text_regex.search(template["text"].replace(WILDCARD, "\0"))
+    ]
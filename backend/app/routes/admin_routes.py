@@ -0,0 +1,65 @@
+from flask import Blueprint, request, jsonify
+from app.controllers.admin_controller import (
+    get_ingest_stats_controller,
+    create_purge_job_controller,
+    get_purge_jobs_controller,
+    get_purge_job_controller,
+    control_purge_job_controller
+)
+
+admin_bp = Blueprint("admin", __name__)
+
+@admin_bp.route("/ingest", methods=["GET"])
+def get_ingest_stats_route():
+    """Get ingest admission (throttling/rejection) counters"""
+    try:
+        stats = get_ingest_stats_controller()
+        return jsonify(stats), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@admin_bp.route("/purge", methods=["POST"])
+def create_purge_job_route():
+    """Start a background job deleting the logs matching Logs Table filters"""
+    try:
+        job = create_purge_job_controller(request.get_json(silent=True))
+        return jsonify(job), 202
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@admin_bp.route("/purge", methods=["GET"])
+def get_purge_jobs_route():
+    """Get recent purge jobs"""
+    try:
+        jobs = get_purge_jobs_controller()
+        return jsonify(jobs), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@admin_bp.route("/purge/<job_id>", methods=["GET"])
+def get_purge_job_route(job_id):
+    """Get a purge job's progress (matched, deleted, ETA)"""
+    try:
+        job = get_purge_job_controller(job_id)
+        if job is None:
+            return jsonify({"error": "Purge job not found"}), 404
+        return jsonify(job), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@admin_bp.route("/purge/<job_id>/<action>", methods=["POST"])
+def control_purge_job_route(job_id, action):
+    """Pause, resume or cancel a purge job"""
+    if action not in ("pause", "resume", "cancel"):
+        return jsonify({"error": "Action must be pause, resume or cancel"}), 404
+    try:
+        job = control_purge_job_controller(job_id, action)
+        if job is None:
+            return jsonify({"error": "Purge job not found"}), 404
+        return jsonify(job), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
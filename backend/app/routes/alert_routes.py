@@ -0,0 +1,48 @@
+from flask import Blueprint, request, jsonify
+from app.controllers.alert_controller import (
+    get_alerts_controller,
+    get_alert_rules_controller,
+    create_alert_rule_controller,
+    delete_alert_rule_controller
+)
+
+alert_bp = Blueprint("alerts", __name__)
+
+@alert_bp.route("/", methods=["GET"])
+def get_alerts_route():
+    """Get the firing state of every alert rule (?state=firing for firing rules only)"""
+    try:
+        alerts = get_alerts_controller(state=request.args.get("state"))
+        return jsonify(alerts), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@alert_bp.route("/rules", methods=["GET"])
+def get_alert_rules_route():
+    """Get all alert rules"""
+    try:
+        rules = get_alert_rules_controller()
+        return jsonify(rules), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@alert_bp.route("/rules", methods=["POST"])
+def create_alert_rule_route():
+    """Create an alert rule"""
+    try:
+        rule = create_alert_rule_controller(request.get_json(silent=True))
+        return jsonify(rule), 201
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@alert_bp.route("/rules/<rule_id>", methods=["DELETE"])
+def delete_alert_rule_route(rule_id):
+    """Delete an alert rule"""
+    try:
+        if not delete_alert_rule_controller(rule_id):
+            return jsonify({"error": "Alert rule not found"}), 404
+        return jsonify({"message": "Alert rule deleted"}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
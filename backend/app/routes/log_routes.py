@@ -1,8 +1,14 @@
+from collections import Counter
 from flask import Blueprint, request, jsonify
-from app.controllers.log_controller import get_filtered_logs, create_log, get_all_logs_controller, get_dashboard_stats, get_recent_logs_controller, get_logs_table_controller, get_tags_controller
+import msgpack
+from app.admission import ingest_admission
+from app.controllers.log_controller import get_filtered_logs, create_log, get_all_logs_controller, get_dashboard_stats, get_monthly_activity_controller, get_recent_logs_controller, get_logs_table_controller, get_tags_controller, get_log_patterns_controller, create_logs_batch, get_facet_suggestions_controller, get_table_facets_controller, get_log_context_controller
 
 log_bp = Blueprint("logs", __name__)
 
+MSGPACK_MIMETYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+MAX_BULK_LOGS = 5000
+
 @log_bp.route("/", methods=["GET"])
 def get_logs():
     try:
@@ -45,22 +51,66 @@ def get_recent_logs():
 @log_bp.route("/stats", methods=["GET"])
 def get_stats():
     try:
-        stats_data = get_dashboard_stats()
+        # approx=true estimates full-history figures from a sample
+        stats_data = get_dashboard_stats(approx=_approx_requested())
         return jsonify(stats_data), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@log_bp.route("/stats/monthly", methods=["GET"])
+def get_monthly_stats():
+    try:
+        chart_data = get_monthly_activity_controller(approx=_approx_requested())
+        return jsonify(chart_data), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @log_bp.route("/", methods=["POST"])
 def add_log():
     try:
-        data = request.get_json()
-        create_log(data)
+        data = _read_ingest_body()
+        
+        rejected = _admit_ingest({_ingest_user(data): 1})
+        if rejected is not None:
+            return rejected
+        
+        try:
+            create_log(data)
+        finally:
+            ingest_admission.release()
         return jsonify({"message": "Log stored"}), 201
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@log_bp.route("/bulk", methods=["POST"])
+def add_logs_bulk():
+    try:
+        records = _read_ingest_body()
+        if not isinstance(records, list):
+            raise ValueError("Bulk body must be an array of log records")
+        if len(records) > MAX_BULK_LOGS:
+            raise ValueError(f"At most {MAX_BULK_LOGS} logs per bulk request")
+        if not records:
+            return jsonify({"stored": 0, "absorbed": 0, "invalid": 0}), 200
+        
+        # Without an API key, each user is charged for their own records
+        user_counts = Counter(_ingest_user(record) for record in records)
+        rejected = _admit_ingest(user_counts)
+        if rejected is not None:
+            return rejected
+        
+        try:
+            result = create_logs_batch(records)
+        finally:
+            ingest_admission.release()
+        return jsonify(result), 201
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @log_bp.route("/table", methods=["GET"])
 def get_logs_table():
     try:
@@ -85,7 +135,41 @@ def get_logs_table():
             end_date=end_date,
             search=search
         )
-        return jsonify(result), 200
+        return _conditional_json(result)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@log_bp.route("/table/facets", methods=["GET"])
+def get_logs_table_facets():
+    try:
+        # Same filter parameters as /table
+        result = get_table_facets_controller(
+            levels=request.args.get("levels"),
+            user_id=request.args.get("userId"),
+            tags=request.args.get("tags"),
+            start_date=request.args.get("startDate"),
+            end_date=request.args.get("endDate"),
+            search=request.args.get("search"),
+            top_n=request.args.get("top", 10),
+            approx=_approx_requested()
+        )
+        return _conditional_json(result)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@log_bp.route("/<log_id>/context", methods=["GET"])
+def get_log_context(log_id):
+    try:
+        before = min(max(int(request.args.get("before", 20)), 0), 200)
+        after = min(max(int(request.args.get("after", 20)), 0), 200)
+        scope = request.args.get("scope", "process")
+        
+        context = get_log_context_controller(log_id, before=before, after=after, scope=scope)
+        if context is None:
+            return jsonify({"error": "Log not found"}), 404
+        return jsonify(context), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -93,6 +177,81 @@ def get_logs_table():
 def get_tags():
     try:
         tags_data = get_tags_controller()
-        return jsonify(tags_data), 200
+        return _conditional_json(tags_data)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@log_bp.route("/facets/<field>", methods=["GET"])
+def get_facet_suggestions(field):
+    try:
+        prefix = request.args.get("prefix", "")
+        limit = min(max(int(request.args.get("limit", 20)), 1), 100)
+        
+        suggestions = get_facet_suggestions_controller(field, prefix=prefix, limit=limit)
+        return jsonify(suggestions), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+@log_bp.route("/patterns", methods=["GET"])
+def get_log_patterns():
+    try:
+        # Extract query parameters
+        start_date = request.args.get("startDate")
+        end_date = request.args.get("endDate")
+        limit = request.args.get("limit", 50)
+        
+        result = get_log_patterns_controller(start_date=start_date, end_date=end_date, limit=limit)
+        return _conditional_json(result)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def _read_ingest_body():
+    """
+    Decode an ingest request body sent as JSON or MessagePack
+    """
+    if request.mimetype in MSGPACK_MIMETYPES:
+        try:
+            # timestamp=3 turns the msgpack timestamp extension into datetime objects
+            return msgpack.unpackb(request.get_data(cache=False), raw=False, timestamp=3)
+        except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as e:
+            raise ValueError(f"Invalid MessagePack body: {str(e) or type(e).__name__}")
+    return request.get_json()
+
+def _ingest_user(record):
+    """
+    Get the userId a record is charged to, as a string: admission runs before
+    validation, so the raw value may be a list or dict
+    """
+    return str(record.get("userId")) if isinstance(record, dict) else "None"
+
+def _admit_ingest(user_counts):
+    """
+    Throttle ingest per source (API key, else userId); user_counts maps each
+    userId to its number of records. Returns a 429 response when rejected;
+    otherwise the caller must release the admission when done
+    """
+    api_key = request.headers.get("X-API-Key")
+    if api_key:
+        retry_after = ingest_admission.try_admit(f"key:{api_key}", label=f"key:{api_key[:4]}***", cost=sum(user_counts.values()))
+    else:
+        retry_after = ingest_admission.try_admit_sources({f"user:{user_id}": count for user_id, count in user_counts.items()})
+    if retry_after is None:
+        return None
+    response = jsonify({"error": "Ingest rate limit exceeded, retry later"})
+    response.headers["Retry-After"] = str(retry_after)
+    return response, 429
+
+def _approx_requested():
+    return request.args.get("approx", "false").lower() == "true"
+
+def _conditional_json(data):
+    """
+    Return a JSON response with an ETag, answering 304 when If-None-Match matches
+    """
+    response = jsonify(data)
+    response.add_etag()
+    # Let browsers keep the body but revalidate every time
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
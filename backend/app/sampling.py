@@ -0,0 +1,119 @@
+import math
+import os
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+approx_latency_budget_ms = float(os.getenv("APPROX_LATENCY_BUDGET_MS", "250"))
+approx_min_sample = int(os.getenv("APPROX_MIN_SAMPLE", "1000"))
+approx_max_sample = int(os.getenv("APPROX_MAX_SAMPLE", "50000"))
+# A filtered estimate built from fewer matching sampled logs than this is too noisy to use
+approx_min_matches = int(os.getenv("APPROX_MIN_MATCHES", "100"))
+
+# Two-sided 95% normal quantile
+Z_95 = 1.96
+
+
+class SampleSizer:
+    """
+    Chooses the $sample size per shard so sampling fits a latency budget.
+
+    Keeps a moving average of the observed time per sampled document and sizes
+    the next sample to take about budget_ms, within [min_size, max_size].
+    """
+
+    def __init__(self, budget_ms=250, min_size=1000, max_size=50000):
+        self.budget_ms = budget_ms
+        self.min_size = min_size
+        self.max_size = max_size
+        self._ms_per_doc = None
+        self._lock = threading.Lock()
+
+    def size(self):
+        with self._lock:
+            if self._ms_per_doc is None:
+                return self.min_size
+            return int(min(self.max_size, max(self.min_size, self.budget_ms / self._ms_per_doc)))
+
+    def record(self, docs, elapsed_seconds):
+        """Feed back how long sampling docs documents took"""
+        if docs <= 0:
+            return
+        observed = max(elapsed_seconds * 1000 / docs, 1e-6)
+        with self._lock:
+            self._ms_per_doc = observed if self._ms_per_doc is None else 0.7 * self._ms_per_doc + 0.3 * observed
+
+
+class SampleEstimate:
+    """
+    Scales weighted counts from per-shard uniform samples up to the population.
+
+    Each shard is a stratum: with N documents and a sample of n, a group's total
+    is estimated as N * mean(y), where y is a document's weight if it belongs
+    to the group and 0 otherwise. The variance includes the finite population
+    correction, so a sample of a whole shard has no error.
+    """
+
+    def __init__(self):
+        self.strata = []
+
+    def add_stratum(self, population, sample_size, sums):
+        """
+        Add one shard: its document count, how many documents were sampled, and
+        {group: (sum of weights, sum of squared weights)} over the sampled documents
+        """
+        if sample_size > 0:
+            self.strata.append((population, sample_size, sums))
+
+    def groups(self):
+        keys = set()
+        for _, _, sums in self.strata:
+            keys.update(sums)
+        return keys
+
+    def estimate(self, group):
+        """Return the group's estimated total with a 95% confidence interval"""
+        total = 0.0
+        variance = 0.0
+        for population, n, sums in self.strata:
+            weight_sum, square_sum = sums.get(group, (0, 0))
+            mean = weight_sum / n
+            total += population * mean
+            if n > 1 and n < population:
+                sample_variance = max(0.0, (square_sum - n * mean * mean) / (n - 1))
+                variance += population * population * (1 - n / population) * sample_variance / n
+        margin = Z_95 * math.sqrt(variance)
+        return {"value": round(total), "low": max(0, round(total - margin)), "high": round(total + margin)}
+
+    def sample_info(self):
+        return {
+            "sampledDocuments": sum(n for _, n, _ in self.strata),
+            "populationDocuments": sum(population for population, _, _ in self.strata),
+            "confidence": 0.95
+        }
+
+
+def group_sums(docs, key_fn, weight_fn):
+    """
+    Sum weights and squared weights per group over sampled documents; key_fn may
+    return None to leave a document out, or a list of groups it belongs to
+    """
+    sums = {}
+    for doc in docs:
+        keys = key_fn(doc)
+        if keys is None:
+            continue
+        weight = weight_fn(doc)
+        for key in keys if isinstance(keys, list) else [keys]:
+            weight_sum, square_sum = sums.get(key, (0, 0))
+            sums[key] = (weight_sum + weight, square_sum + weight * weight)
+    return sums
+
+
+sample_sizer = SampleSizer(
+    budget_ms=approx_latency_budget_ms,
+    min_size=approx_min_sample,
+    max_size=approx_max_sample
+)
@@ -0,0 +1,146 @@
+import hashlib
+import os
+import re
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+template_mining_enabled = os.getenv("LOG_TEMPLATE_MINING", "true").lower() == "true"
+# "reference" keeps the message next to the template id; "compact" drops it when it
+# can be rebuilt exactly from its template and parameters, at the cost of table
+# searches only matching the template text or a single parameter
+template_storage_mode = os.getenv("LOG_TEMPLATE_STORAGE", "reference")
+
+WILDCARD = "<*>"
+
+# Tokens that are almost always parameters (numbers, hex ids, IPs, UUIDs, paths with digits)
+_VARIABLE_TOKEN = re.compile(r".*\d.*")
+
+
+def template_id_for(template_tokens):
+    """
+    Get the deterministic id of a template, so every worker assigns the same id
+    """
+    return hashlib.sha1(" ".join(template_tokens).encode("utf-8")).hexdigest()[:16]
+
+
+def render_template(template_tokens, params):
+    """
+    Rebuild a message from template tokens and the parameters extracted for it
+    """
+    values = iter(params or [])
+    return " ".join(next(values, WILDCARD) if token == WILDCARD else token for token in template_tokens)
+
+
+class _Cluster:
+    def __init__(self, template_tokens):
+        self.template = template_tokens
+        self.template_id = template_id_for(template_tokens)
+
+
+class TemplateMiner:
+    """
+    Online log template miner following Drain (He et al., ICWS 2017).
+
+    Messages are split on whitespace and routed through a fixed-depth prefix tree
+    keyed on token count and the first few tokens. Each leaf holds clusters; a
+    message joins the most similar cluster above the similarity threshold, turning
+    the positions that differ into wildcards, or starts a new cluster.
+
+    Stored templates are immutable: when a cluster generalizes it gets a new id and
+    the previous template is reported as superseded, so logs already referencing
+    the old id still render correctly.
+    """
+
+    def __init__(self, depth=4, similarity_threshold=0.4, max_children=100):
+        self.depth = max(depth, 3)
+        self.similarity_threshold = similarity_threshold
+        self.max_children = max_children
+        self.loaded = False
+        self._root = {}
+        self._lock = threading.Lock()
+
+    def load(self, templates):
+        """Seed the tree with previously stored template token lists"""
+        with self._lock:
+            if self.loaded:
+                return
+            for template_tokens in templates:
+                self._leaf_for(template_tokens).append(_Cluster(list(template_tokens)))
+            self.loaded = True
+
+    def add_message(self, message):
+        """
+        Match message to a template, creating or generalizing one if needed.
+        Returns a dict with templateId, template (tokens), params, isNew and
+        supersedes (the previous template id when the cluster generalized).
+        """
+        tokens = message.split()
+        with self._lock:
+            clusters = self._leaf_for(tokens)
+            cluster = self._best_match(clusters, tokens)
+            supersedes = None
+            is_new = False
+
+            if cluster is None:
+                cluster = _Cluster([WILDCARD if _VARIABLE_TOKEN.match(token) else token for token in tokens])
+                clusters.append(cluster)
+                is_new = True
+            else:
+                merged = [
+                    template_token if template_token == token else WILDCARD
+                    for template_token, token in zip(cluster.template, tokens)
+                ]
+                if merged != cluster.template:
+                    supersedes = cluster.template_id
+                    cluster.template = merged
+                    cluster.template_id = template_id_for(merged)
+                    is_new = True
+
+            template = cluster.template
+            template_id = cluster.template_id
+
+        params = [token for template_token, token in zip(template, tokens) if template_token == WILDCARD]
+        return {
+            "templateId": template_id,
+            "template": template,
+            "params": params,
+            "isNew": is_new,
+            "supersedes": supersedes
+        }
+
+    def _leaf_for(self, tokens):
+        node = self._root.setdefault(len(tokens), {})
+        for token in tokens[:self.depth - 2]:
+            key = WILDCARD if _VARIABLE_TOKEN.match(token) else token
+            if key not in node:
+                key = key if len(node) < self.max_children else WILDCARD
+            node = node.setdefault(key, {})
+        return node.setdefault(None, [])
+
+    def _best_match(self, clusters, tokens):
+        best, best_similarity, best_wildcards = None, -1.0, -1
+        for cluster in clusters:
+            if not tokens:
+                return cluster
+            same = 0
+            wildcards = 0
+            for template_token, token in zip(cluster.template, tokens):
+                if template_token == WILDCARD:
+                    wildcards += 1
+                elif template_token == token:
+                    same += 1
+            similarity = same / len(tokens)
+            if similarity > best_similarity or (similarity == best_similarity and wildcards > best_wildcards):
+                best, best_similarity, best_wildcards = cluster, similarity, wildcards
+        if best is not None and (best_similarity >= self.similarity_threshold or best_wildcards == len(tokens)):
+            return best
+        return None
+
+
+template_miner = TemplateMiner(
+    depth=int(os.getenv("LOG_TEMPLATE_DEPTH", "4")),
+    similarity_threshold=float(os.getenv("LOG_TEMPLATE_SIMILARITY", "0.4"))
+)
@@ -0,0 +1,118 @@
+"""
+Raw parse + validate throughput of a log record, without touching MongoDB:
+
+    cd backend && python -m benchmarks.ingest_parse_benchmark [records]
+
+Compares the original create_log validation with validate_log_record, first on
+already decoded records (validation alone), then with JSON and MessagePack
+decoding included. Each figure is the best of three runs.
+"""
+import datetime
+import json
+import sys
+import time
+
+import msgpack
+
+from app.log_validator import validate_log_record
+
+
+def legacy_validate(data):
+    """
+    create_log's validation before validate_log_record, verbatim, kept as the baseline
+    """
+    if not data:
+        raise ValueError("Invalid log data")
+    required_fields = ["userId", "level", "message", "timestamp"]
+    for field in required_fields:
+        if field not in data or data[field] is None:
+            raise ValueError(f"Missing required field: {field}")
+    timestamp_str = data["timestamp"]
+    try:
+        if isinstance(timestamp_str, str):
+            try:
+                timestamp_dt = datetime.datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+            except ValueError:
+                try:
+                    timestamp_dt = datetime.datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
+                except ValueError:
+                    try:
+                        timestamp_dt = datetime.datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S.%f")
+                    except ValueError:
+                        raise ValueError(f"Invalid timestamp format: {timestamp_str}. Expected formats: 'YYYY-MM-DD HH:mm:ss', 'YYYY-MM-DD HH:mm:ss.fff', or ISO format")
+        elif isinstance(timestamp_str, datetime.datetime):
+            timestamp_dt = timestamp_str
+        else:
+            raise ValueError(f"Timestamp must be a string or datetime object, got {type(timestamp_str)}")
+    except Exception as e:
+        raise ValueError(f"Error parsing timestamp: {str(e)}")
+    log_entry = {
+        "userId": data["userId"],
+        "level": data["level"],
+        "message": data["message"],
+        "timestamp": timestamp_dt
+    }
+    for field in ["tag", "threadId", "processId", "packageName"]:
+        if field in data and data[field] is not None:
+            log_entry[field] = data[field]
+    return log_entry
+
+
+def _record(timestamp):
+    return {
+        "userId": "user-1234",
+        "level": "info",
+        "tag": "network",
+        "message": "Request to /api/v1/items completed in 123 ms",
+        "timestamp": timestamp,
+        "threadId": "main",
+        "processId": "4242",
+        "packageName": "com.example.app"
+    }
+
+
+def _run(name, bodies, decode, validate, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for body in bodies:
+            validate(decode(body))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<48} {len(bodies) / best:>12,.0f} records/s")
+
+
+def _decoded(body):
+    return body
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    json_iso = [json.dumps(_record(now.isoformat().replace("+00:00", "Z"))).encode() for _ in range(count)]
+    json_space = [json.dumps(_record(now.strftime("%Y-%m-%d %H:%M:%S.%f"))).encode() for _ in range(count)]
+    msgpack_epoch = [msgpack.packb(_record(int(now.timestamp() * 1000))) for _ in range(count)]
+    msgpack_ext = [msgpack.packb(_record(now), datetime=True) for _ in range(count)]
+
+    def unpack(body):
+        return msgpack.unpackb(body, raw=False, timestamp=3)
+
+    records_iso = [json.loads(body) for body in json_iso]
+    records_space = [json.loads(body) for body in json_space]
+
+    print(f"{count:,} records per run")
+    print("Validation only:")
+    _run("  ISO 'Z' timestamp, legacy validation", records_iso, _decoded, legacy_validate)
+    _run("  ISO 'Z' timestamp, validate_log_record", records_iso, _decoded, validate_log_record)
+    _run("  'YYYY-MM-DD HH:mm:ss.fff', legacy validation", records_space, _decoded, legacy_validate)
+    _run("  'YYYY-MM-DD HH:mm:ss.fff', validate_log_record", records_space, _decoded, validate_log_record)
+    print("Decode + validate:")
+    _run("  JSON, ISO 'Z' timestamp, legacy validation", json_iso, json.loads, legacy_validate)
+    _run("  JSON, ISO 'Z' timestamp, validate_log_record", json_iso, json.loads, validate_log_record)
+    _run("  MessagePack, epoch ms, validate_log_record", msgpack_epoch, unpack, validate_log_record)
+    _run("  MessagePack, timestamp ext, validate_log_record", msgpack_ext, unpack, validate_log_record)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Gunicorn settings for running the LogTrail backend in production:
+
+    gunicorn -c gunicorn.conf.py "app:create_app()"
+
+Every value can be overridden through the environment variables read below.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+
+# Request handling is mostly waiting on MongoDB, so a few processes per core,
+# each with a handful of threads, keeps the cores busy without extra memory
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+# Import the app once in the master; the Mongo client is created lazily per worker
+preload_app = True
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# On SIGTERM workers stop accepting and get this long to finish in-flight requests
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+# Recycle workers periodically to bound memory growth
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def post_fork(server, worker):
+    # Make sure no client state from the master leaks into the worker
+    from app.db import close_client
+    from app.purge import purge_sweeper
+    close_client()
+    # Every worker watches for purge jobs left behind by a recycled worker
+    purge_sweeper.ensure_started()
+
+
+def worker_exit(server, worker):
+    # In-flight requests have drained by now; write collapsed repeats, alert and facet counts, then close the pool
+    from app.alerting import alert_engine
+    from app.db import close_client
+    from app.facets import facet_index
+    from app.flood_control import flood_control
+    flood_control.flush()
+    alert_engine.flush()
+    facet_index.flush()
+    close_client()
@@ -9,5 +9,32 @@ db.logs.createIndex({ "timestamp": -1 });
 db.logs.createIndex({ "level": 1 });
 db.logs.createIndex({ "source": 1 });
 db.logs.createIndex({ "timestamp": -1, "level": 1 });
+db.logs.createIndex({ "templateId": 1, "timestamp": -1 });
+
+// Context view around a log (/logs/<id>/context): each scope reads one bounded range per side
+db.logs.createIndex({ "userId": 1, "timestamp": 1, "_id": 1 });
+db.logs.createIndex({ "userId": 1, "processId": 1, "timestamp": 1, "_id": 1 });
+db.logs.createIndex({ "userId": 1, "processId": 1, "threadId": 1, "timestamp": 1, "_id": 1 });
+
+// Mined message templates referenced by logs.templateId
+db.createCollection('log_templates');
+db.log_templates.createIndex({ "supersededBy": 1 }, { sparse: true });
+
+// Alert rules and their shared windowed counters (one document per rule and bucket)
+db.createCollection('alert_rules');
+db.createCollection('alert_windows');
+db.alert_windows.createIndex({ "bucket": 1 });
+db.alert_windows.createIndex({ "expireAt": 1 }, { expireAfterSeconds: 0 });
+
+// Facet dictionary of tags, userIds and packageNames. The database starts empty,
+// so the dictionary is complete from the start (existing databases: python -m app.facets --rebuild)
+db.createCollection('log_facets');
+db.log_facets.createIndex({ "field": 1, "value": 1 }, { unique: true });
+db.log_facets.createIndex({ "updatedAt": 1 });
+db.log_facets.insertOne({ _id: "rebuild", rebuiltAt: new Date() });
+
+// Background purge jobs and their progress
+db.createCollection('purge_jobs');
+db.purge_jobs.createIndex({ "createdAt": -1 });
 
 print('Database logtrail initialized with logs collection and indexes'); 
\ No newline at end of file
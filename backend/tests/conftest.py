@@ -0,0 +1,122 @@
+"""
+Integration tests against real MongoDB deployments. Each test is skipped unless
+its deployment is configured:
+
+    TEST_MONGO_REPLICA_URI=mongodb://localhost:27018/?replicaSet=rs0
+    TEST_MONGO_SHARD_URIS=mongodb://localhost:27021,mongodb://localhost:27022
+
+Tests write to a throwaway database that is dropped afterwards.
+"""
+import os
+import sys
+import uuid
+
+import pytest
+from pymongo import MongoClient, monitoring
+from pymongo.errors import PyMongoError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.db
+import app.repositories.log_repository as log_repository
+
+
+class CommandRecorder(monitoring.CommandListener):
+    """Records the commands a client sends and the server each one went to"""
+
+    def __init__(self):
+        self.events = []
+
+    def started(self, event):
+        self.events.append(event)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def commands(self, name):
+        return [event for event in self.events if event.command_name == name]
+
+    def clear(self):
+        self.events = []
+
+
+def _reachable(uri):
+    client = MongoClient(uri, serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command("ping")
+        return True
+    except PyMongoError:
+        return False
+    finally:
+        client.close()
+
+
+def _use_targets(monkeypatch, uris, recorder=None):
+    """
+    Point app.db and the log repository's shard handles at uris and a fresh
+    database, for the duration of one test
+    """
+    database = f"logtrail_test_{uuid.uuid4().hex[:8]}"
+    options = dict(app.db.mongo_client_options)
+    if recorder is not None:
+        options["event_listeners"] = [recorder]
+
+    app.db.close_client()
+    monkeypatch.setattr(app.db, "shard_uris", uris)
+    monkeypatch.setattr(app.db, "shard_count", len(uris))
+    monkeypatch.setattr(app.db, "db_name", database)
+    monkeypatch.setattr(app.db, "mongo_client_options", options)
+    for name, role in (("logs_shards", "primary"), ("logs_live_shards", "live"), ("logs_analytics_shards", "analytics")):
+        monkeypatch.setattr(log_repository, name, [app.db.db.reading("logs", role, shard) for shard in range(len(uris))])
+    monkeypatch.setattr(log_repository, "logs_analytics_collection", app.db.db.reading("logs", "analytics"))
+    return database
+
+
+def _drop(uris, database):
+    app.db.close_client()
+    for uri in uris:
+        client = MongoClient(uri)
+        try:
+            client.drop_database(database)
+        finally:
+            client.close()
+
+
+@pytest.fixture
+def recorder():
+    return CommandRecorder()
+
+
+@pytest.fixture
+def replica_set(monkeypatch, recorder):
+    uri = os.getenv("TEST_MONGO_REPLICA_URI")
+    if not uri or not _reachable(uri):
+        pytest.skip("TEST_MONGO_REPLICA_URI is not set or not reachable")
+    client = MongoClient(uri)
+    try:
+        if "setName" not in client.admin.command("hello"):
+            pytest.skip("TEST_MONGO_REPLICA_URI is not a replica set")
+    finally:
+        client.close()
+
+    database = _use_targets(monkeypatch, [uri], recorder)
+    yield app.db.get_client(0)
+    _drop([uri], database)
+
+
+@pytest.fixture
+def sharded(monkeypatch):
+    uris = [uri.strip() for uri in os.getenv("TEST_MONGO_SHARD_URIS", "").split(",") if uri.strip()]
+    if len(uris) < 2 or not all(_reachable(uri) for uri in uris):
+        pytest.skip("TEST_MONGO_SHARD_URIS does not list two or more reachable targets")
+
+    database = _use_targets(monkeypatch, uris)
+    # Direct handles on each target, to check where the repository put things
+    clients = [MongoClient(uri) for uri in uris]
+    yield [client[database]["logs"] for client in clients]
+    for client in clients:
+        client.close()
+    _drop(uris, database)
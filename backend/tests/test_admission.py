@@ -0,0 +1,78 @@
+import pytest
+
+import app.admission
+from app.admission import IngestAdmission
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(app.admission, "time", clock)
+    return clock
+
+
+def test_each_source_spends_its_own_bucket(clock):
+    admission = IngestAdmission(rate=1, burst=3, max_in_flight=0)
+
+    assert admission.try_admit_sources({"user:a": 3}) is None
+    assert admission.try_admit_sources({"user:a": 1}) == 1
+    assert admission.try_admit_sources({"user:b": 3}) is None
+
+
+def test_sources_are_charged_all_or_nothing(clock):
+    admission = IngestAdmission(rate=1, burst=5, max_in_flight=0)
+    assert admission.try_admit_sources({"user:a": 4}) is None
+
+    # a has 1 token left, so the whole write is rejected and b keeps its tokens
+    assert admission.try_admit_sources({"user:a": 3, "user:b": 5}) == 2
+    assert admission.try_admit_sources({"user:b": 5}) is None
+    assert admission.stats()["rejectedRateLimited"] == 1
+
+
+def test_buckets_refill_over_time(clock):
+    admission = IngestAdmission(rate=2, burst=4, max_in_flight=0)
+    assert admission.try_admit_sources({"user:a": 4}) is None
+    assert admission.try_admit_sources({"user:a": 2}) == 1
+
+    clock.now += 1
+    assert admission.try_admit_sources({"user:a": 2}) is None
+
+
+def test_cost_is_capped_at_the_burst(clock):
+    admission = IngestAdmission(rate=1, burst=10, max_in_flight=0)
+
+    assert admission.try_admit_sources({"user:a": 500}) is None
+    assert admission.try_admit_sources({"user:a": 1}) == 1
+
+
+def test_in_flight_limit_counts_writes_not_sources(clock):
+    admission = IngestAdmission(rate=0, max_in_flight=1)
+
+    assert admission.try_admit_sources({"user:a": 1, "user:b": 1}) is None
+    assert admission.try_admit_sources({"user:c": 1}) == 1
+    admission.release()
+    assert admission.try_admit_sources({"user:c": 1}) is None
+    assert admission.stats()["rejectedInFlight"] == 1
+
+
+def test_try_admit_charges_one_source_with_a_label(clock):
+    admission = IngestAdmission(rate=1, burst=2, max_in_flight=0)
+
+    assert admission.try_admit("key:secret", label="key:secr***", cost=2) is None
+    assert admission.try_admit("key:secret", label="key:secr***") == 1
+    assert admission.stats()["topRejectedSources"] == [{"source": "key:secr***", "rejected": 1}]
+
+
+def test_missing_source_is_charged_as_anonymous(clock):
+    admission = IngestAdmission(rate=1, burst=1, max_in_flight=0)
+
+    assert admission.try_admit_sources({None: 1}) is None
+    assert admission.try_admit_sources({"anonymous": 1}) == 1
@@ -0,0 +1,85 @@
+import datetime
+
+import pytest
+
+from app.archive import matches_query
+
+DOC = {
+    "userId": "u1",
+    "level": "error",
+    "tag": "auth",
+    "message": "Login FAILED for admin",
+    "tags": ["db", "slow"],
+    "timestamp": datetime.datetime(2026, 1, 2, 3, 4, 5)
+}
+
+
+@pytest.mark.parametrize("query, expected", [
+    ({}, True),
+    ({"level": "error"}, True),
+    ({"level": "info"}, False),
+    ({"level": "error", "tag": "db"}, False),
+    ({"level": {"$in": ["warning", "error"]}}, True),
+    ({"level": {"$in": ["info"]}}, False),
+    ({"message": {"$regex": "failed"}}, False),
+    ({"message": {"$regex": "failed", "$options": "i"}}, True),
+    ({"message": {"$regex": "^Login"}}, True),
+    ({"processId": {"$regex": "1"}}, False),
+    ({"tag": {"$exists": True}}, True),
+    ({"processId": {"$exists": True}}, False),
+    ({"processId": {"$exists": False}}, True),
+    ({"message": {"$exists": False}}, False),
+])
+def test_operators(query, expected):
+    assert matches_query(DOC, query) is expected
+
+
+@pytest.mark.parametrize("query, expected", [
+    ({"tags": "db"}, True),
+    ({"tags": "auth"}, False),
+    ({"tags": ["db", "slow"]}, True),
+    ({"tags": {"$in": ["slow", "x"]}}, True),
+    ({"tags": {"$regex": "^sl"}}, True),
+])
+def test_conditions_on_arrays_match_any_element(query, expected):
+    assert matches_query(DOC, query) is expected
+
+
+def test_timestamp_ranges():
+    start = datetime.datetime(2026, 1, 2)
+    end = datetime.datetime(2026, 1, 3)
+
+    assert matches_query(DOC, {"timestamp": {"$gte": start, "$lt": end}})
+    assert matches_query(DOC, {"timestamp": {"$gte": DOC["timestamp"], "$lte": DOC["timestamp"]}})
+    assert not matches_query(DOC, {"timestamp": {"$gt": DOC["timestamp"]}})
+    assert not matches_query(DOC, {"timestamp": {"$lt": start}})
+    assert not matches_query({"message": "no timestamp"}, {"timestamp": {"$gte": start}})
+
+
+def test_aware_range_bounds_are_compared_in_utc():
+    bound = datetime.datetime(2026, 1, 2, 5, 4, 5, tzinfo=datetime.timezone(datetime.timedelta(hours=2)))
+
+    assert matches_query(DOC, {"timestamp": {"$gte": bound, "$lte": bound}})
+
+
+def test_range_against_a_different_type_does_not_match():
+    assert not matches_query({"timestamp": "2026-01-02"}, {"timestamp": {"$gte": datetime.datetime(2026, 1, 1)}})
+
+
+def test_or_matches_when_any_clause_does():
+    assert matches_query(DOC, {"$or": [{"level": "info"}, {"tag": "auth"}]})
+    assert not matches_query(DOC, {"$or": [{"level": "info"}, {"tag": "db"}]})
+    assert not matches_query(DOC, {"level": "info", "$or": [{"tag": "auth"}]})
+
+
+def test_compact_template_clause_skips_logs_that_keep_their_message():
+    query = {"$or": [{"message": {"$regex": "timeout"}}, {"templateId": {"$in": [7]}, "message": {"$exists": False}}]}
+
+    assert matches_query({"templateId": 7}, query)
+    assert not matches_query({"templateId": 7, "message": "Login failed"}, query)
+    assert matches_query({"message": "read timeout"}, query)
+
+
+def test_unsupported_operator_is_rejected():
+    with pytest.raises(ValueError):
+        matches_query(DOC, {"level": {"$ne": "info"}})
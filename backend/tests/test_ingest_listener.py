@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from app.ingest_listener import _parse_structured_data, _read_frames, parse_syslog
+
+
+def _frames(data):
+    async def collect():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return [frame async for frame in _read_frames(reader)]
+    return asyncio.run(collect())
+
+
+def test_rfc5424_fields_map_onto_the_log_record():
+    record = parse_syslog("<11>1 2026-01-02T03:04:05Z phone-7 auth 4242 ID47 - Login failed", peer_host="10.0.0.1")
+
+    assert record == {
+        "userId": "phone-7",
+        "level": "error",
+        "tag": "auth",
+        "processId": "4242",
+        "timestamp": "2026-01-02T03:04:05Z",
+        "message": "Login failed"
+    }
+
+
+def test_nil_values_keep_the_defaults():
+    record = parse_syslog("<14>1 - - - - - - hello", peer_host="10.0.0.1")
+
+    assert record["userId"] == "10.0.0.1"
+    assert record["level"] == "info"
+    assert "tag" not in record and "processId" not in record
+    assert record["message"] == "hello"
+
+
+def test_logtrail_structured_data_overrides_the_mapping():
+    line = '<15>1 2026-01-02T03:04:05Z host app 1 - [logtrail@32473 userId="u1" threadId="main" level="warning"] \ufeffbody'
+    record = parse_syslog(line)
+
+    assert record["userId"] == "u1"
+    assert record["threadId"] == "main"
+    assert record["level"] == "warning"
+    assert record["message"] == "body"
+
+
+def test_lines_that_are_not_rfc5424_are_stored_whole():
+    # RFC 3164: the priority still sets the level
+    record = parse_syslog("<34>Oct 11 22:14:15 mymachine su: failed", peer_host="h")
+    assert record["level"] == "error"
+    assert record["message"] == "Oct 11 22:14:15 mymachine su: failed"
+
+    record = parse_syslog("plain text", peer_host="h")
+    assert (record["userId"], record["level"], record["message"]) == ("h", "info", "plain text")
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("- message", ({}, "message")),
+    ("-", ({}, "")),
+    ('[other@1 a="b"] message', ({}, "message")),
+    ('[logtrail@32473 tag="x\\"y\\]z"] message', ({"tag": 'x"y]z'}, "message")),
+    ('[other@1 a="b"][logtrail@32473 userId="u2" tag="t"] message', ({"userId": "u2", "tag": "t"}, "message")),
+    ("[logtrail@32473] message", ({}, "message")),
+    ('[logtrail@32473 userId="u3"]', ({"userId": "u3"}, "")),
+])
+def test_structured_data(text, expected):
+    assert _parse_structured_data(text) == expected
+
+
+def test_unterminated_structured_data_is_left_in_the_message():
+    assert _parse_structured_data('[logtrail@32473 userId="u1" message') == ({}, '[logtrail@32473 userId="u1" message')
+
+
+def test_newline_framing():
+    assert _frames(b"<14>1 first\n<14>1 second\n") == [b"<14>1 first\n", b"<14>1 second\n"]
+
+
+def test_octet_counted_framing():
+    assert _frames(b"5 hello11 hello world") == [b"hello", b"hello world"]
+
+
+def test_octet_counted_frames_may_be_separated_by_newlines():
+    assert _frames(b"5 hello\n11 hello world\r\n\n3 end\n") == [b"hello", b"hello world", b"end"]
+
+
+def test_oversized_octet_counted_frame_is_rejected():
+    with pytest.raises(ValueError):
+        _frames(b"99999999 x")
@@ -0,0 +1,124 @@
+import datetime
+
+import pytest
+
+import app.cache
+from app.cache import QueryCache
+
+
+def day(n):
+    return datetime.datetime(2026, 1, n)
+
+
+@pytest.fixture
+def cache():
+    # No sync: nothing is read from or published to MongoDB
+    return QueryCache(max_entries=16, ttl_seconds=0, sync_seconds=0)
+
+
+def test_write_drops_only_entries_whose_range_contains_it(cache):
+    cache.put("early", "a", lower=day(1), upper=day(5))
+    cache.put("late", "b", lower=day(10), upper=day(20))
+    cache.put("no-lower", "c", upper=day(4))
+    cache.put("untracked", "d", lower=day(1), upper=day(5), track_writes=False)
+
+    cache.record_write(day(3))
+
+    assert cache.get("early") is None
+    assert cache.get("late") == "b"
+    assert cache.get("no-lower") is None
+    assert cache.get("untracked") == "d"
+
+
+def test_range_bounds_are_inclusive(cache):
+    cache.put("lower", "a", lower=day(3), upper=day(5))
+    cache.put("upper", "b", lower=day(1), upper=day(3))
+
+    cache.record_write(day(3))
+
+    assert cache.get("lower") is None
+    assert cache.get("upper") is None
+
+
+def test_write_newer_than_every_bounded_entry_only_drops_open_ended_ones(cache):
+    cache.put("bounded", "a", lower=day(1), upper=day(5))
+    cache.put("open", "b", lower=day(1))
+
+    cache.record_write(day(6))
+
+    assert cache.get("bounded") == "a"
+    assert cache.get("open") is None
+    # An entry stored after the write is fresh again
+    cache.put("open", "c", lower=day(1))
+    assert cache.get("open") == "c"
+
+
+def test_bounded_scan_still_runs_after_entries_are_dropped(cache):
+    cache.put("a", 1, lower=day(1), upper=day(10))
+    cache.put("b", 2, lower=day(1), upper=day(5))
+    cache.record_write(day(8))
+    assert cache.get("a") is None and cache.get("b") == 2
+
+    # The largest remaining upper bound is now day 5
+    cache.record_write(day(4))
+    assert cache.get("b") is None
+
+
+def test_value_computed_across_a_covering_write_is_not_stored(cache):
+    def compute():
+        cache.record_write(day(2))
+        return "before the write"
+
+    assert cache.get_or_compute("page", compute, lower=day(1), upper=day(4)) == "before the write"
+    assert cache.get("page") is None
+
+
+def test_value_computed_across_an_unrelated_write_is_stored(cache):
+    def compute():
+        cache.record_write(day(9))
+        return "unaffected"
+
+    cache.get_or_compute("page", compute, lower=day(1), upper=day(4))
+    assert cache.get("page") == "unaffected"
+
+
+def test_value_computed_across_an_invalidation_is_not_stored(cache):
+    def compute():
+        cache.invalidate()
+        return "stale"
+
+    cache.get_or_compute("tags", compute, track_writes=False)
+    assert cache.get("tags") is None
+
+
+def test_writes_published_by_another_process_drop_covered_entries(monkeypatch):
+    state = {"value": 0, "writes": []}
+
+    def publish(origin, lower=None, upper=None):
+        state["value"] += 1
+        state["writes"].append({"origin": origin, "lower": lower, "upper": upper})
+
+    monkeypatch.setattr(app.cache, "get_cache_state", lambda: (state["value"], list(state["writes"])))
+    monkeypatch.setattr(app.cache, "publish_cache_write", publish)
+    writer = QueryCache(ttl_seconds=0, sync_seconds=1e-9)
+    reader = QueryCache(ttl_seconds=0, sync_seconds=1e-9)
+    writer._process_origin()
+    writer._origin = "writer"
+    # Published explicitly below instead of by the background thread
+    monkeypatch.setattr(writer._publisher, "ensure_started", lambda: None)
+
+    reader.get("first sync")
+    reader.put("covered", "a", lower=day(1), upper=day(5))
+    reader.put("outside", "b", lower=day(10), upper=day(20))
+
+    writer.record_write(day(2))
+    writer.record_write(day(4))
+    writer.publish_writes()
+
+    assert state["writes"][-1]["lower"] == day(2)
+    assert reader.get("covered") is None
+    assert reader.get("outside") == "b"
+
+    # Archive and purge runs publish no range, which drops everything
+    publish(None)
+    assert reader.get("outside") is None
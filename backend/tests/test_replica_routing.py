@@ -0,0 +1,61 @@
+import datetime
+
+import app.db
+import app.repositories.log_repository as log_repository
+
+
+def _log(user_id, minutes):
+    return {
+        "userId": user_id,
+        "level": "info",
+        "tag": "routing",
+        "message": f"log {minutes}",
+        "timestamp": datetime.datetime(2026, 1, 1) + datetime.timedelta(minutes=minutes)
+    }
+
+
+def _read_preference(event):
+    # Omitted for primary reads, which is the server's default
+    return event.command.get("$readPreference", {"mode": "primary"})
+
+
+def test_writes_go_to_the_primary(replica_set, recorder):
+    log_repository.insert_log(_log("user-1", 0))
+
+    inserts = recorder.commands("insert")
+    assert inserts
+    assert all(event.connection_id == replica_set.primary for event in inserts)
+
+
+def test_analytics_reads_use_bounded_secondary_preferred(replica_set, recorder):
+    log_repository.insert_logs([_log("user-1", minutes) for minutes in range(3)])
+    recorder.clear()
+
+    log_repository.get_total_logs_count()
+    log_repository.get_all_tags()
+
+    reads = recorder.commands("aggregate") + recorder.commands("distinct")
+    assert reads
+    for event in reads:
+        preference = _read_preference(event)
+        assert preference["mode"] == "secondaryPreferred"
+        assert preference["maxStalenessSeconds"] == app.db.analytics_max_staleness
+        if replica_set.secondaries:
+            assert event.connection_id in replica_set.secondaries
+        else:
+            # A set without secondaries serves them from the primary
+            assert event.connection_id == replica_set.primary
+
+
+def test_live_console_reads_prefer_the_primary(replica_set, recorder):
+    log_repository.insert_logs([_log("user-1", minutes) for minutes in range(3)])
+    recorder.clear()
+
+    logs = log_repository.get_recent_logs(limit=2)
+
+    assert [log["message"] for log in logs] == ["log 1", "log 2"]
+    finds = recorder.commands("find")
+    assert finds
+    for event in finds:
+        assert _read_preference(event)["mode"] == "primaryPreferred"
+        assert event.connection_id == replica_set.primary
@@ -0,0 +1,93 @@
+import random
+
+from app.sampling import SampleEstimate, SampleSizer, group_sums
+
+WEIGHT = lambda doc: doc.get("count", 1)
+
+
+def test_whole_population_sample_is_exact():
+    docs = [{"level": "error"}] * 3 + [{"level": "info"}] * 7
+    estimate = SampleEstimate()
+    estimate.add_stratum(10, 10, group_sums(docs, lambda doc: doc["level"], WEIGHT))
+
+    assert estimate.estimate("error") == {"value": 3, "low": 3, "high": 3}
+    assert estimate.estimate("info") == {"value": 7, "low": 7, "high": 7}
+    assert estimate.estimate("warning") == {"value": 0, "low": 0, "high": 0}
+
+
+def test_sample_is_scaled_to_the_population_with_an_interval():
+    # 100 sampled of 1000, a quarter of them in the group
+    docs = [{"level": "error"}] * 25 + [{"level": "info"}] * 75
+    estimate = SampleEstimate()
+    estimate.add_stratum(1000, 100, group_sums(docs, lambda doc: doc["level"], WEIGHT))
+
+    error = estimate.estimate("error")
+    assert error["value"] == 250
+    assert error["low"] < 250 < error["high"]
+    # 1.96 * 1000 * sqrt((1 - 0.1) * s^2 / 100) with s^2 = 25 * 0.75 / 99
+    assert error["high"] - 250 == round(1.96 * 1000 * ((0.9 * 25 * 0.75 / 99) / 100) ** 0.5)
+
+
+def test_unmatched_sampled_documents_count_as_zeros():
+    # A filter applied after $sample: 5 of 100 sampled logs matched
+    matched = [{"level": "error"}] * 5
+    estimate = SampleEstimate()
+    estimate.add_stratum(10000, 100, group_sums(matched, lambda doc: "total", WEIGHT))
+
+    total = estimate.estimate("total")
+    assert total["value"] == 500
+    # Relative error is much wider than for a group covering most of the sample
+    assert total["high"] - total["low"] > total["value"]
+
+
+def test_strata_add_up():
+    estimate = SampleEstimate()
+    estimate.add_stratum(100, 10, {"total": (10, 10)})
+    estimate.add_stratum(50, 50, {"total": (50, 50)})
+    estimate.add_stratum(80, 0, {})
+
+    assert estimate.estimate("total")["value"] == 150
+    assert estimate.groups() == {"total"}
+    assert estimate.sample_info() == {"sampledDocuments": 60, "populationDocuments": 150, "confidence": 0.95}
+
+
+def test_weights_are_summed_and_squared():
+    docs = [{"tag": "db", "count": 3}, {"tag": "db"}, {"tag": "auth", "count": 2}, {"tag": None}]
+    sums = group_sums(docs, lambda doc: doc["tag"], WEIGHT)
+
+    assert sums == {"db": (4, 10), "auth": (2, 4)}
+
+
+def test_group_sums_skips_none_and_accepts_several_groups():
+    docs = [{"tag": "db", "level": "info"}, {"tag": "db", "level": "error"}, {}]
+    key_fn = lambda doc: ["total", ("level", doc["level"])] if doc else None
+
+    assert group_sums(docs, key_fn, WEIGHT) == {"total": (2, 2), ("level", "info"): (1, 1), ("level", "error"): (1, 1)}
+
+
+def test_interval_covers_the_true_total_most_of_the_time():
+    rng = random.Random(7)
+    population = [{"count": rng.choice([1, 1, 1, 5])} if rng.random() < 0.3 else {} for _ in range(5000)]
+    true_total = sum(doc["count"] for doc in population if doc)
+    covered = 0
+    for _ in range(200):
+        sample = rng.sample(population, 400)
+        estimate = SampleEstimate()
+        estimate.add_stratum(len(population), len(sample), group_sums(sample, lambda doc: "g" if doc else None, WEIGHT))
+        result = estimate.estimate("g")
+        covered += result["low"] <= true_total <= result["high"]
+    assert covered >= 180
+
+
+def test_sizer_fits_the_latency_budget():
+    sizer = SampleSizer(budget_ms=100, min_size=10, max_size=1000)
+    assert sizer.size() == 10
+
+    # 0.5ms per document: 200 documents fit in 100ms
+    sizer.record(100, 0.05)
+    assert sizer.size() == 200
+
+    sizer.record(100, 10)
+    assert sizer.size() == 10
+    sizer.record(0, 1)
+    assert sizer.size() == 10
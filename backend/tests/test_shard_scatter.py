@@ -0,0 +1,65 @@
+import datetime
+
+import app.db
+import app.repositories.log_repository as log_repository
+
+USERS = [f"user-{i}" for i in range(12)]
+
+
+def _logs(count):
+    start = datetime.datetime(2026, 1, 1)
+    return [
+        {
+            "userId": USERS[i % len(USERS)],
+            "level": "error" if i % 5 == 0 else "info",
+            "tag": f"tag-{i % 4}",
+            "message": f"log {i}",
+            "timestamp": start + datetime.timedelta(seconds=i)
+        }
+        for i in range(count)
+    ]
+
+
+def test_logs_are_written_to_their_users_shard(sharded):
+    log_repository.insert_logs(_logs(60))
+
+    for shard, collection in enumerate(sharded):
+        users = set(collection.distinct("userId"))
+        assert users == {user for user in USERS if app.db.shard_for_user(user) == shard}
+    assert sum(collection.count_documents({}) for collection in sharded) == 60
+
+
+def test_pages_merge_in_timestamp_order_across_shards(sharded):
+    logs = _logs(60)
+    log_repository.insert_logs(logs)
+    newest_first = [log["message"] for log in sorted(logs, key=lambda log: log["timestamp"], reverse=True)]
+
+    for page in (1, 2, 5):
+        result = log_repository.get_logs_with_pagination(page=page, limit=7)
+        assert [log["message"] for log in result["logs"]] == newest_first[(page - 1) * 7:page * 7]
+        assert result["pagination"]["total_count"] == 60
+
+    last_page = log_repository.get_logs_with_pagination(page=9, limit=7)
+    assert [log["message"] for log in last_page["logs"]] == newest_first[56:]
+
+
+def test_filtered_pages_and_limits_across_shards(sharded):
+    logs = _logs(60)
+    log_repository.insert_logs(logs)
+    errors = [log["message"] for log in sorted(logs, key=lambda log: log["timestamp"], reverse=True) if log["level"] == "error"]
+
+    result = log_repository.get_logs_with_pagination(page=2, limit=5, level="error")
+    assert [log["message"] for log in result["logs"]] == errors[5:10]
+    assert result["pagination"]["total_count"] == len(errors)
+
+    recent = log_repository.get_recent_logs(limit=4)
+    assert [log["message"] for log in recent] == ["log 56", "log 57", "log 58", "log 59"]
+
+
+def test_counts_and_distinct_values_combine_across_shards(sharded):
+    log_repository.insert_logs(_logs(60))
+
+    assert log_repository.get_total_logs_count() == 60
+    assert log_repository.get_error_logs_count() == 12
+    assert log_repository.get_unique_users_count() == len(USERS)
+    assert log_repository.get_all_tags() == ["tag-0", "tag-1", "tag-2", "tag-3"]